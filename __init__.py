@@ -6,5 +6,28 @@ __email__ = "m.hollands@sheffield.ac.uk"
 
 from .state import *
 from .transitions import *
+from .synthesis import *
+from .lineshapes import *
+from .spectrum import *
+from .index import *
+from .dipole import *
+from .emulator import *
+from .fitting import *
+from .shared import *
 from .data import *
-from .plots import *
+from .linelist import *
+
+#matplotlib is slow to import, so plots are only loaded when first used.
+#They are still listed in __all__, so "from magnetic import *" provides them
+#as before, at the cost of importing matplotlib.
+_PLOTS = ["diagram_transitions", "diagram_energies"]
+__all__ = [name for name in globals() if not name.startswith("_")] + _PLOTS
+
+def __getattr__(name):
+    if name in _PLOTS:
+        from . import plots
+        return getattr(plots, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + _PLOTS)
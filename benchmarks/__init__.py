@@ -0,0 +1,6 @@
+"""
+Benchmarks for magnetic, laid out for airspeed velocity (asv). They can also
+be run offline without asv, writing machine readable results:
+
+    python -m magnetic.benchmarks --output results.json
+"""
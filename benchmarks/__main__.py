@@ -0,0 +1,123 @@
+"""
+Offline runner for the asv style benchmarks in this package. Each time_*
+method is timed for every combination of its class parameters, timeraw_*
+code is timed in a fresh interpreter, and track_* methods are recorded, with
+the results written as JSON.
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import numpy as np
+import scipy
+
+MODULES = ["bench_import", "bench_state", "bench_multiplet", "bench_plots"]
+
+TIMERAW = """
+import time
+t0 = time.perf_counter()
+exec({code!r})
+print(time.perf_counter()-t0)
+"""
+
+def iter_benchmarks(pattern=""):
+    """
+    Generator for (name, class, method name) of all benchmarks matching the
+    pattern.
+    """
+    for mod_name in MODULES:
+        module = importlib.import_module(f"{__package__}.{mod_name}")
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for meth in dir(cls):
+                if not meth.startswith(("time_", "timeraw_", "track_")):
+                    continue
+                name = f"{mod_name}.{cls_name}.{meth}"
+                if pattern in name:
+                    yield name, cls, meth
+
+def time_raw(code, repeat):
+    """
+    Time a snippet of code in fresh python processes.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    script = TIMERAW.format(code=code)
+    return np.array([float(subprocess.run([sys.executable, "-c", script], env=env,
+        check=True, capture_output=True, text=True).stdout) for _ in range(repeat)])
+
+def run_benchmark(cls, meth, params, repeat, min_time):
+    """
+    Run a single benchmark for one combination of parameters.
+    """
+    bench = cls()
+    if hasattr(bench, "setup"):
+        bench.setup(*params)
+    try:
+        func = getattr(bench, meth)
+        if meth.startswith("track_"):
+            return {"value" : func(*params)}
+        if meth.startswith("timeraw_"):
+            number, times = 1, time_raw(func(*params), repeat)
+        else:
+            timer = timeit.Timer(lambda: func(*params))
+            number, _ = timer.autorange()
+            number = max(1, int(number*min_time/0.2))
+            times = np.array(timer.repeat(repeat=repeat, number=number))/number
+        return {
+            "min" : float(times.min()),
+            "median" : float(np.median(times)),
+            "number" : number,
+            "repeat" : repeat,
+        }
+    finally:
+        if hasattr(bench, "teardown"):
+            bench.teardown(*params)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", "-o", default="-",
+        help="JSON output file, or - for stdout")
+    parser.add_argument("--filter", "-k", default="",
+        help="only run benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2,
+        help="minimum time per repeat [s]")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, cls, meth in iter_benchmarks(args.filter):
+        params = getattr(cls, "params", [])
+        param_names = getattr(cls, "param_names", [])
+        for combo in itertools.product(*params):
+            result = run_benchmark(cls, meth, combo, args.repeat, args.min_time)
+            result.update(name=name, params=dict(zip(param_names, combo)))
+            results.append(result)
+            print(name, combo, result.get("min", result.get("value")), file=sys.stderr)
+
+    output = {
+        "meta" : {
+            "timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python" : platform.python_version(),
+            "numpy" : np.__version__,
+            "scipy" : scipy.__version__,
+            "machine" : platform.machine(),
+            "processor" : platform.processor(),
+        },
+        "results" : results,
+    }
+    if args.output == "-":
+        json.dump(output, sys.stdout, indent=1)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Benchmarks for the time to import the package in a fresh interpreter.
+"""
+
+class TimeImport:
+    def timeraw_import(self):
+        return "import magnetic"
+
+    def timeraw_import_and_get_multiplet(self):
+        return "import magnetic; magnetic.atomic_data['Fe 5300']"
+
+    def timeraw_import_plots(self):
+        return "import magnetic.plots"
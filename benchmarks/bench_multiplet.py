@@ -0,0 +1,59 @@
+"""
+Benchmarks for Zeeman components and synthetic profiles of multiplets.
+"""
+from magnetic import atomic_data
+from .common import MULTIPLETS, FIELDS, GRID_SIZES, wavelength_grid
+
+ENGINES = {
+    "direct" : {},
+    "window" : {"cutoff" : 30},
+    "fft" : {"engine" : "fft"},
+}
+
+class TimeCompile:
+    params = [MULTIPLETS]
+    param_names = ["multiplet"]
+
+    def setup(self, name):
+        self.multiplet = atomic_data[name]
+
+    def time_compile(self, name):
+        self.multiplet.compile()
+
+    def track_components(self, name):
+        return len(self.multiplet.table)
+
+class TimeTransitions:
+    params = [MULTIPLETS, FIELDS]
+    param_names = ["multiplet", "B"]
+
+    def setup(self, name, B):
+        self.multiplet = atomic_data[name]
+
+    def time_transitions(self, name, B):
+        for _ in self.multiplet.transitions(B):
+            pass
+
+class TimeProfile:
+    params = [MULTIPLETS, FIELDS, GRID_SIZES, list(ENGINES)]
+    param_names = ["multiplet", "B", "n_pix", "engine"]
+    timeout = 300
+
+    def setup(self, name, B, n_pix, engine):
+        self.multiplet = atomic_data[name]
+        self.x = wavelength_grid(self.multiplet, n_pix)
+
+    def time_profile(self, name, B, n_pix, engine):
+        self.multiplet.profile(B, self.x, 0.5, 0.3, 0.2, **ENGINES[engine])
+
+class TimeProfileThreads:
+    params = [MULTIPLETS, FIELDS, [1, 2, 4, 8]]
+    param_names = ["multiplet", "B", "workers"]
+    timeout = 300
+
+    def setup(self, name, B, workers):
+        self.multiplet = atomic_data[name]
+        self.x = wavelength_grid(self.multiplet, GRID_SIZES[-1])
+
+    def time_profile(self, name, B, workers):
+        self.multiplet.profile(B, self.x, 0.5, 0.3, 0.2, workers=workers)
@@ -0,0 +1,26 @@
+"""
+Benchmarks for the Zeeman splitting diagrams.
+"""
+import warnings
+import matplotlib
+import matplotlib.pyplot as plt
+from magnetic import atomic_data, diagram_transitions, diagram_energies
+from .common import MULTIPLETS
+
+class TimePlots:
+    params = [MULTIPLETS]
+    param_names = ["multiplet"]
+
+    def setup(self, name):
+        matplotlib.use("Agg")
+        warnings.filterwarnings("ignore", message=".*non-interactive")
+        self.multiplet = atomic_data[name]
+
+    def teardown(self, name):
+        plt.close("all")
+
+    def time_diagram_transitions(self, name):
+        diagram_transitions(self.multiplet, 5000.)
+
+    def time_diagram_energies(self, name):
+        diagram_energies(self.multiplet, 5000.)
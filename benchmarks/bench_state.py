@@ -0,0 +1,26 @@
+"""
+Benchmarks for State construction and energy levels.
+"""
+from magnetic import State, atomic_data
+from .common import MULTIPLETS, FIELDS
+
+class TimeState:
+    params = [MULTIPLETS, FIELDS]
+    param_names = ["multiplet", "B"]
+
+    def setup(self, name, B):
+        M = atomic_data[name]
+        self.states = M.Lower_states + M.Upper_states
+        self.args = [(S.k0, S.J, S.L, S.S) for S in self.states]
+
+    def time_construction(self, name, B):
+        for args in self.args:
+            State(*args)
+
+    def time_energies(self, name, B):
+        for S in self.states:
+            S.energies(B)
+
+    def time_energy_array(self, name, B):
+        for S in self.states:
+            S.energy_array(B)
@@ -0,0 +1,17 @@
+"""
+Shared parameters for the benchmarks.
+"""
+import numpy as np
+from magnetic import atomic_data
+
+MULTIPLETS = list(atomic_data)
+FIELDS = [0., 1000., 5000.]
+GRID_SIZES = [1000, 10000, 200000]
+
+def wavelength_grid(multiplet, n_pix, B=5000., pad=20.):
+    """
+    Uniform wavelength grid covering all components of a multiplet up to a
+    field strength B [kG].
+    """
+    x_lines = np.concatenate([multiplet.table.wavelengths(0.), multiplet.table.wavelengths(B)])
+    return np.linspace(x_lines.min()-pad, x_lines.max()+pad, n_pix)
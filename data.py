@@ -2,15 +2,119 @@
 Atomic data for common metal line multiplets are defined here. You can
 create additional multiplets using the Multiplets class.
 """
+from collections.abc import MutableMapping
 from .state import State
 from .transitions import Multiplet
+from .index import MultipletIndex
 
-__all__ = ["atomic_data"]
+__all__ = ["atomic_data", "multiplets_in_window"]
 
-atomic_data = {}
+class _Pending:
+    """
+    Placeholder for a registry entry that has not been constructed yet, with
+    its wavenumber bounds if they are known in advance.
+    """
+    def __init__(self, factory, bounds=None):
+        self.factory = factory
+        self.bounds = bounds
+
+class LazyRegistry(MutableMapping):
+    """
+    Dictionary of multiplets in which entries added with 'register' are only
+    constructed, by calling their factory function, when first accessed.
+    Entries can also be assigned directly as in a normal dictionary.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._index = None
+
+    def register(self, key, factory, bounds=None):
+        """
+        Add an entry constructed by calling 'factory' when first accessed.
+        'bounds' can give the result of its Multiplet.wavenumber_bounds, so
+        that indexing the registry does not construct the entry.
+        """
+        self._entries[key] = _Pending(factory, bounds)
+        self._index = None
+
+    def __getitem__(self, key):
+        value = self._entries[key]
+        if isinstance(value, _Pending):
+            value = self._entries[key] = value.factory()
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._index = None
+
+    def __delitem__(self, key):
+        del self._entries[key]
+        self._index = None
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"LazyRegistry({list(self._entries)})"
+
+    def update(self, other=(), **kwargs):
+        """
+        As dict.update, except that pending entries of another LazyRegistry
+        are copied without being constructed.
+        """
+        if isinstance(other, LazyRegistry):
+            self._entries.update(other._entries)
+            self._index = None
+            other = ()
+        super().update(other, **kwargs)
+
+    def wavenumber_bounds(self, key):
+        """
+        Multiplet.wavenumber_bounds of an entry, which is only constructed if
+        its bounds were not given when it was registered.
+        """
+        value = self._entries[key]
+        if isinstance(value, _Pending) and value.bounds is not None:
+            return value.bounds
+        return self[key].wavenumber_bounds()
+
+    def index(self):
+        """
+        MultipletIndex over all entries, constructing any pending entries
+        registered without bounds. The index is kept until the registry is
+        modified.
+        """
+        if self._index is None:
+            self._index = MultipletIndex.from_bounds((key, self.wavenumber_bounds(key))
+                for key in self)
+        return self._index
+
+atomic_data = LazyRegistry()
+
+def multiplets_in_window(wmin, wmax, Bmax=0., margin=0., multiplets=None):
+    """
+    Dictionary of the multiplets in atomic_data (or the dictionary
+    'multiplets') with components between wmin-margin and wmax+margin [AA]
+    for any field strength up to Bmax [kG], see MultipletIndex.query. The index
+    of a LazyRegistry is reused between calls, so line lists should be added
+    to atomic_data, e.g. atomic_data.update(read_linelist(path)).
+    """
+    if multiplets is None:
+        multiplets = atomic_data
+    if isinstance(multiplets, LazyRegistry):
+        index = multiplets.index()
+    else:
+        index = MultipletIndex(multiplets)
+    return {name : multiplets[name] for name in index.query(wmin, wmax, Bmax, margin)}
 
 #Na D
-atomic_data['Na D'] = Multiplet(
+atomic_data.register('Na D', lambda: Multiplet(
     Upper_states = [
         State(16973.37, 3/2, 1, 1/2),
         State(16956.17, 1/2, 1, 1/2),
@@ -22,10 +126,10 @@ atomic_data['Na D'] = Multiplet(
         (1/2, 3/2) :  0.108,
         (1/2, 1/2) : -0.194,
     }
-)
+))
 
 #Na 8200AA
-atomic_data['Na 82'] = Multiplet(
+atomic_data.register('Na 82', lambda: Multiplet(
     Upper_states = [
         State(29172.88, 3/2, 2, 1/2),
         State(29172.84, 5/2, 2, 1/2),
@@ -39,10 +143,10 @@ atomic_data['Na 82'] = Multiplet(
         (3/2, 3/2) : -0.462,
         (3/2, 5/2) :  0.492,
     }
-)
+))
 
 #Mg-b
-atomic_data['Mg b'] = Multiplet(
+atomic_data.register('Mg b', lambda: Multiplet(
     Upper_states = [
         State(41197.403, 1, 0, 1),
     ],
@@ -56,10 +160,10 @@ atomic_data['Mg b'] = Multiplet(
         (1, 1) : -0.450,
         (2, 1) : -0.239
     }
-)
+))
 
 #AlI 3950AA
-atomic_data['Al i'] = Multiplet(
+atomic_data.register('Al i', lambda: Multiplet(
     Upper_states = [
         State(25347.756, 1/2, 0, 1/2),
     ],
@@ -71,10 +175,10 @@ atomic_data['Al i'] = Multiplet(
         (1/2, 1/2) : -0.623,
         (3/2, 1/2) : -0.323,
     }
-)
+))
 
 #KI doublet
-atomic_data['KI'] = Multiplet(
+atomic_data.register('KI', lambda: Multiplet(
     Upper_states = [
         State(13042.90, 3/2, 1, 1/2),
         State(12985.19, 1/2, 1, 1/2),
@@ -86,10 +190,10 @@ atomic_data['KI'] = Multiplet(
         (1/2, 3/2) :  0.149,
         (1/2, 1/2) : -0.154,
     }
-)
+))
 
 #Ca i resonance line
-atomic_data['Ca 4227'] = Multiplet(
+atomic_data.register('Ca 4227', lambda: Multiplet(
     Upper_states = [
         State(23652.304, 1, 1, 0),
     ],
@@ -99,10 +203,10 @@ atomic_data['Ca 4227'] = Multiplet(
     log_gf = {
         (0, 1) : 0.265,
     }
-)
+))
 
 #Ca HK
-atomic_data['Ca HK'] = Multiplet(
+atomic_data.register('Ca HK', lambda: Multiplet(
     Upper_states = [
         State(25414.40, 3/2, 1, 1/2),
         State(25191.51, 1/2, 1, 1/2),
@@ -114,10 +218,10 @@ atomic_data['Ca HK'] = Multiplet(
         (1/2, 3/2) :  0.092,
         (1/2, 1/2) : -0.213,
     }
-)
+))
 
 #Ca triplet
-atomic_data['Ca triplet'] = Multiplet(
+atomic_data.register('Ca triplet', lambda: Multiplet(
     Upper_states = [
         State(25414.40, 3/2, 1, 1/2),
         State(25191.51, 1/2, 1, 1/2),
@@ -131,10 +235,10 @@ atomic_data['Ca triplet'] = Multiplet(
         (5/2, 3/2) : -0.476,
         (3/2, 1/2) : -0.736,
     }
-)
+))
 
 #CrI triplet
-atomic_data['Cr i'] = Multiplet(
+atomic_data.register('Cr i', lambda: Multiplet(
     Upper_states = [
         State(26801.9009, 1, 1, 2),
         State(26796.2691, 2, 1, 2),
@@ -148,10 +252,10 @@ atomic_data['Cr i'] = Multiplet(
         (2, 2) :  0.019,
         (2, 3) :  0.158,
     }
-)
+))
 
 #Fe 4300AA 3F->3G
-atomic_data['Fe 4300'] = Multiplet(
+atomic_data.register('Fe 4300', lambda: Multiplet(
     Upper_states = [
         State(35379.208, 5, 4, 1),
         State(35767.564, 4, 4, 1),
@@ -170,10 +274,10 @@ atomic_data['Fe 4300'] = Multiplet(
         (3, 4) : -0.072, #4309.11
         (2, 3) : -0.006, #4326.98
     }
-)
+))
 
 #Fe 4400AA 3F->5G
-atomic_data['Fe 4400'] = Multiplet(
+atomic_data.register('Fe 4400', lambda: Multiplet(
     Upper_states = [
         State(34782.421, 5, 4, 2), #There is a J=6 state but can't transition to
         State(35257.324, 4, 4, 2), #lower states since Delta J = 0, ±1
@@ -194,10 +298,10 @@ atomic_data['Fe 4400'] = Multiplet(
         (3, 4) : -0.142, #4405.99
         (2, 3) : -0.615, #4416.36
     }
-)
+))
 
 #Fe 5300AA 5F->5D
-atomic_data['Fe 5300'] = Multiplet(
+atomic_data.register('Fe 5300', lambda: Multiplet(
     Upper_states = [
         State(25899.989, 4, 2, 2),
         State(26140.179, 3, 2, 2),
@@ -226,4 +330,4 @@ atomic_data['Fe 5300'] = Multiplet(
         (3, 4) : -3.047, #5502.99
         (2, 3) : -2.797, #5508.31
     }
-)
+))
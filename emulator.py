@@ -0,0 +1,173 @@
+"""
+Fast interpolation emulator of multiplet opacities on a fixed wavelength grid.
+"""
+import os
+import hashlib
+import numpy as np
+from .transitions import Multiplet
+from .spectrum import SpectrumModel
+from .synthesis import sum_profiles_batch
+
+__all__ = ["Emulator"]
+
+class Emulator:
+    """
+    Precomputed table of the opacity of one or more multiplets on a fixed
+    wavelength grid x, tabulated over field strength B and temperature T, and
+    evaluated by multilinear interpolation. The line widths and radial
+    velocity are fixed when the table is built.
+
+    The viewing angle psi is not interpolated: the opacities of the pi and
+    sigma components are tabulated separately and combined exactly.
+
+    Example:
+    >>> emu = Emulator(atomic_data['Ca HK'], x, np.arange(0, 2001, 10.),
+    ...     [5000., 6000., 7000.], 0.3, 0.2, cache="emu_CaHK")
+    >>> flux = emu.profile(512., 0.5, 6500., 1.2)
+
+    If 'cache' is a directory containing a table built with the same
+    multiplets and parameters, it is loaded from there (memory mapped),
+    otherwise the table is built and saved to it. Further keyword arguments
+    are passed to synthesis.sum_profiles_batch when building the table.
+    """
+    def __init__(self, multiplets, x, B_grid, T_grid, res_l, res_g, rv=0,
+        cache=None, **kwargs):
+        if isinstance(multiplets, Multiplet):
+            multiplets = [multiplets]
+        self.multiplets = list(multiplets)
+        self.x = np.asarray(x, dtype=float)
+        self.B_grid = np.atleast_1d(B_grid).astype(float)
+        self.T_grid = np.atleast_1d(T_grid).astype(float)
+        self.res_l, self.res_g, self.rv = res_l, res_g, rv
+        self.kwargs = kwargs
+        self.key = self._key()
+
+        if cache is not None and os.path.exists(os.path.join(cache, "table.npy")):
+            cached = self.load(cache)
+            if cached.key == self.key:
+                self.table = cached.table
+                return
+        self.table = self._build()
+        if cache is not None:
+            self.save(cache)
+
+    def _key(self):
+        """
+        Hash identifying the multiplets and parameters of the table.
+        """
+        h = hashlib.sha1()
+        for M in self.multiplets:
+            h.update(np.ascontiguousarray(M.table.data).tobytes())
+        for arr in (self.x, self.B_grid, self.T_grid):
+            h.update(arr.tobytes())
+        h.update(repr((self.res_l, self.res_g, self.rv, sorted(self.kwargs.items()))).encode())
+        return h.hexdigest()
+
+    def _build(self):
+        """
+        Tabulate opacities with shape (n_multiplets, 2, n_B, n_T, n_x), where
+        the second axis separates pi and sigma components.
+        """
+        n_B, n_T = len(self.B_grid), len(self.T_grid)
+        table = np.zeros((len(self.multiplets), 2, n_B, n_T, len(self.x)))
+        z = 1 + self.rv/2.998e5
+        for i, M in enumerate(self.multiplets):
+            tab = M.table
+            x_lines = tab.wavelengths(self.B_grid) * z
+            for k, is_part in enumerate((tab.dmJ == 0, tab.dmJ != 0)):
+                for j, T in enumerate(self.T_grid):
+                    weights = tab.boltzmann(self.B_grid, T) * tab.gf * is_part
+                    sum_profiles_batch(self.x, x_lines, weights, self.res_l,
+                        self.res_g, table[i,k,:,j], **self.kwargs)
+        return table
+
+    def save(self, path):
+        """
+        Save the table to the directory 'path', as a .npy file that can be
+        memory mapped, with the grids in a separate .npz file.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "table.npy"), self.table)
+        np.savez(os.path.join(path, "meta.npz"), x=self.x, B_grid=self.B_grid,
+            T_grid=self.T_grid, widths=[self.res_l, self.res_g, self.rv],
+            key=self.key)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an emulator saved with Emulator.save. With mmap, the table is
+        memory mapped read-only rather than read into memory. The multiplets
+        are not stored, so must be given to Emulator.error_estimate.
+        """
+        self = cls.__new__(cls)
+        with np.load(os.path.join(path, "meta.npz")) as meta:
+            self.x, self.B_grid, self.T_grid = meta['x'], meta['B_grid'], meta['T_grid']
+            self.res_l, self.res_g, self.rv = meta['widths']
+            self.key = str(meta['key'])
+        self.multiplets = []
+        self.kwargs = {}
+        self.table = np.load(os.path.join(path, "table.npy"),
+            mmap_mode='r' if mmap else None)
+        return self
+
+    @staticmethod
+    def _interp_weights(grid, value, name):
+        """
+        Indices and weights of the two grid points bracketing a value.
+        """
+        if len(grid) == 1:
+            return (0, 0), (1., 0.)
+        if not grid[0] <= value <= grid[-1]:
+            raise ValueError(f"{name}={value} outside of emulator grid")
+        i = min(np.searchsorted(grid, value, side='right'), len(grid)-1)
+        t = (value-grid[i-1])/(grid[i]-grid[i-1])
+        return (i-1, i), (1-t, t)
+
+    def opacity(self, B, psi=1, T=6000., strengths=1.):
+        """
+        Interpolated opacity for field strength B [kG], viewing angle psi
+        [radians] and temperature T [K], with 'strengths' scaling each
+        multiplet (or a single shared value).
+        """
+        (iB0, iB1), (wB0, wB1) = self._interp_weights(self.B_grid, B, "B")
+        (iT0, iT1), (wT0, wT1) = self._interp_weights(self.T_grid, T, "T")
+        strengths = np.broadcast_to(strengths, (len(self.table),))
+        rot = np.array([np.sin(psi)**2, 1+np.cos(psi)**2])
+        tau = np.zeros(len(self.x))
+        for iB, wB in ((iB0, wB0), (iB1, wB1)):
+            for iT, wT in ((iT0, wT0), (iT1, wT1)):
+                if wB*wT == 0:
+                    continue
+                coeffs = wB*wT * strengths[:,None] * rot[None,:]
+                tau += np.tensordot(coeffs, self.table[:,:,iB,iT], axes=2)
+        return tau
+
+    def profile(self, B, psi=1, T=6000., strengths=1.):
+        """
+        Interpolated synthetic spectrum, see Emulator.opacity.
+        """
+        tau = self.opacity(B, psi, T, strengths)
+        tau *= -1
+        return np.exp(tau, out=tau)
+
+    def error_estimate(self, multiplets=None, n_samples=20, seed=None):
+        """
+        Maximum absolute error of the emulated spectrum with unit strengths,
+        compared to the exact calculation, for each of n_samples random
+        (B, psi, T) within the grid. Returns the samples and their errors.
+        """
+        if multiplets is None:
+            multiplets = self.multiplets
+        if isinstance(multiplets, Multiplet):
+            multiplets = [multiplets]
+        model = SpectrumModel(multiplets)
+        rng = np.random.default_rng(seed)
+        samples = np.column_stack([
+            rng.uniform(self.B_grid[0], self.B_grid[-1], n_samples),
+            rng.uniform(0, np.pi/2, n_samples),
+            rng.uniform(self.T_grid[0], self.T_grid[-1], n_samples),
+        ])
+        errors = np.array([np.max(np.abs(self.profile(B, psi, T) \
+            - model.profile(B, self.x, 1., self.res_l, self.res_g, psi, T,
+            self.rv, margin=np.inf))) for B, psi, T in samples])
+        return samples, errors
@@ -0,0 +1,154 @@
+"""
+Least-squares fitting of multiplet models to many spectra in parallel.
+"""
+import os
+import json
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from .transitions import Multiplet, ComponentTable
+from .spectrum import SpectrumModel
+
+__all__ = [
+    "FitResult",
+    "fit_spectrum",
+    "BatchFitter",
+]
+
+FIT_PARAMS = ("B", "res_l", "res_g", "psi", "rv")
+DEFAULT_P0 = {"B" : 100., "res_l" : 0.1, "res_g" : 0.5, "psi" : 1., "rv" : 0.}
+FitResult = namedtuple("FitResult", "key params strengths cost success nfev")
+
+def _bounds(n_multiplets):
+    """
+    Lower and upper bounds of the parameters FIT_PARAMS followed by one
+    strength per multiplet.
+    """
+    lower = [0., 0., 1e-6, 0., -np.inf] + [0.]*n_multiplets
+    upper = [np.inf, np.inf, np.inf, np.pi/2, np.inf] + [np.inf]*n_multiplets
+    return lower, upper
+
+def fit_spectrum(model, x, y, sigma, p0=None, T=6000., key=None, **kwargs):
+    """
+    Fit a SpectrumModel to a normalised spectrum y with uncertainties sigma at
+    wavelengths x, varying the parameters FIT_PARAMS (B, res_l, res_g, psi,
+    rv) and the strength of each multiplet, at fixed temperature T. p0 is a
+    dictionary of starting values, including 'strengths' (a single value or
+    one per multiplet), with defaults from DEFAULT_P0 and strengths of 1.
+    Further keyword arguments are passed to SpectrumModel.profile. Returns a
+    FitResult.
+    """
+    from scipy.optimize import least_squares #slow to import, so only when needed
+    if isinstance(model, Multiplet):
+        model = SpectrumModel([model])
+    x, y, sigma = (np.asarray(a, dtype=float) for a in (x, y, sigma))
+    p0 = {**DEFAULT_P0, "strengths" : 1., **(p0 or {})}
+    n = len(model)
+    start = [p0[name] for name in FIT_PARAMS] + list(np.broadcast_to(p0["strengths"], (n,)))
+    lower, upper = _bounds(n)
+    start = np.clip(start, lower, upper)
+
+    def residuals(p):
+        B, res_l, res_g, psi, rv = p[:5]
+        flux = model.profile(B, x, p[5:], res_l, res_g, psi, T, rv, **kwargs)
+        return (flux-y)/sigma
+
+    result = least_squares(residuals, start, bounds=(lower, upper), x_scale='jac')
+    params = dict(zip(FIT_PARAMS, map(float, result.x[:5])))
+    return FitResult(key, params, result.x[5:].tolist(), float(result.cost),
+        bool(result.success), int(result.nfev))
+
+#model of each worker process, set once by _init_worker
+_worker_model = None
+
+def _init_worker(data, n_components):
+    global _worker_model
+    starts = np.cumsum(n_components) - n_components
+    tables = [ComponentTable(data[:, i:i+n]) for i, n in zip(starts, n_components)]
+    _worker_model = SpectrumModel.from_tables(tables)
+
+def _fit_task(key, x, y, sigma, p0, T, kwargs):
+    return fit_spectrum(_worker_model, x, y, sigma, p0, T, key, **kwargs)
+
+class BatchFitter:
+    """
+    Fits a set of multiplets to many spectra using a pool of processes. The
+    compiled component tables are sent to each worker process once, when it
+    starts (inherited without copying where processes are forked), so each
+    task only carries its spectrum.
+
+    Example:
+    >>> fitter = BatchFitter([atomic_data['Na D'], atomic_data['Ca HK']],
+    ...     processes=16, checkpoint="fits.jsonl")
+    >>> for result in fitter.fit(spectra):
+    ...     print(result.key, result.params["B"])
+
+    where spectra is a dictionary of (x, y, sigma) tuples, keyed by a string
+    identifying each spectrum. A fourth element of a tuple can give starting
+    values for that spectrum, see fit_spectrum. Results are yielded as they
+    finish. With a checkpoint file, each result is appended to it as a line
+    of JSON, and spectra already in the file are not fitted again, so an
+    interrupted run can be resumed by repeating the call.
+    """
+    def __init__(self, multiplets, processes=None, checkpoint=None, T=6000.,
+        **kwargs):
+        if isinstance(multiplets, Multiplet):
+            multiplets = [multiplets]
+        self.tables = [M.table for M in multiplets]
+        self.processes = processes or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.T = T
+        self.kwargs = kwargs
+
+    def completed(self):
+        """
+        Dictionary of the FitResults saved in the checkpoint file, by key.
+        """
+        results = {}
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return results
+        with open(self.checkpoint) as f:
+            for line in f:
+                try:
+                    result = FitResult(**json.loads(line))
+                except ValueError:
+                    continue #partially written final line
+                results[result.key] = result
+        return results
+
+    def fit(self, spectra, p0=None):
+        """
+        Fit each spectrum in the dictionary 'spectra', yielding FitResults as
+        they finish, starting with any already in the checkpoint file. p0
+        holds starting values for spectra without their own, see
+        fit_spectrum. Closing the generator early cancels any pending fits.
+        """
+        done = self.completed()
+        yield from (done[key] for key in spectra if key in done)
+        todo = [key for key in spectra if key not in done]
+        if not todo:
+            return
+
+        data = np.hstack([tab.data for tab in self.tables])
+        n_components = [len(tab) for tab in self.tables]
+        pool = ProcessPoolExecutor(min(self.processes, len(todo)),
+            initializer=_init_worker, initargs=(data, n_components))
+        try:
+            futures = []
+            for key in todo:
+                x, y, sigma, *start = spectra[key]
+                futures.append(pool.submit(_fit_task, key, x, y, sigma,
+                    start[0] if start else p0, self.T, self.kwargs))
+            for future in as_completed(futures):
+                result = future.result()
+                self._save(result)
+                yield result
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _save(self, result):
+        if self.checkpoint is None:
+            return
+        with open(self.checkpoint, "a") as f:
+            f.write(json.dumps(result._asdict()) + "\n")
+            f.flush()
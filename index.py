@@ -0,0 +1,80 @@
+"""
+Index of multiplets by wavelength, for selecting those that can contribute to
+a spectral window.
+"""
+import numpy as np
+
+__all__ = ["MultipletIndex"]
+
+class MultipletIndex:
+    """
+    Interval index over the wavelength spans of a dictionary of multiplets.
+    Component wavenumbers are linear in the field strength, so for fields up
+    to Bmax each multiplet lies within its zero-field wavenumber range widened
+    by Bmax times a bound on its shift per kG (Multiplet.wavenumber_bounds).
+    The zero-field ranges are sorted by their lower end, so a window query is
+    a binary search followed by an exact check of the candidates.
+
+    Example:
+    >>> index = MultipletIndex(atomic_data)
+    >>> index.query(3900., 4000., Bmax=1000.)
+    ['Ca HK', 'Al i']
+    """
+    def __init__(self, multiplets):
+        self._set_bounds((name, M.wavenumber_bounds()) for name, M in multiplets.items())
+
+    @classmethod
+    def from_bounds(cls, bounds):
+        """
+        MultipletIndex of (name, bounds) pairs, with bounds as returned by
+        Multiplet.wavenumber_bounds, without needing the multiplets.
+        """
+        self = cls.__new__(cls)
+        self._set_bounds(bounds)
+        return self
+
+    def _set_bounds(self, bounds):
+        names, k_min, k_max, rate = [], [], [], []
+        for name, span in bounds:
+            if span is None:
+                continue
+            names.append(name)
+            k_min.append(span[0])
+            k_max.append(span[1])
+            rate.append(span[2])
+        order = np.argsort(k_min, kind='stable')
+        self.names = [names[i] for i in order]
+        self.k_min = np.array(k_min, dtype=float)[order]
+        self.k_max = np.array(k_max, dtype=float)[order]
+        self.rate = np.array(rate, dtype=float)[order]
+        self.max_width = np.max(self.k_max-self.k_min, initial=0.)
+        self.max_rate = np.max(self.rate, initial=0.)
+
+    def __len__(self):
+        return len(self.names)
+
+    def spans(self, Bmax=0.):
+        """
+        Minimum and maximum wavelength [AA] of each indexed multiplet, for
+        field strengths up to Bmax [kG], in the order of self.names.
+        """
+        return 1e8/(self.k_max + self.rate*Bmax), 1e8/(self.k_min - self.rate*Bmax)
+
+    def query(self, wmin, wmax, Bmax=0., margin=0.):
+        """
+        Names of the multiplets with any components between wmin-margin and
+        wmax+margin [AA] for some field strength up to Bmax [kG], in order of
+        their minimum zero-field wavenumber. Spans are conservative, so a multiplet may be
+        included when only its extreme components approach the window.
+        """
+        if wmin > wmax:
+            raise ValueError("wmin must not exceed wmax")
+        lo = wmin - margin
+        k_lo = 1e8/(wmax + margin)
+        k_hi = 1e8/lo if lo > 0 else np.inf
+        shift = self.max_rate*Bmax
+        i0 = np.searchsorted(self.k_min, k_lo - self.max_width - shift, side='left')
+        i1 = np.searchsorted(self.k_min, k_hi + shift, side='right')
+        shift = self.rate[i0:i1]*Bmax
+        hit = (self.k_min[i0:i1] - shift <= k_hi) & (self.k_max[i0:i1] + shift >= k_lo)
+        return [self.names[i0+i] for i in np.flatnonzero(hit)]
@@ -0,0 +1,242 @@
+"""
+Bulk loading of line lists into Multiplets. Lines are read into arrays, their
+levels validated together in a LevelTable, and grouped by term into
+multiplets.
+"""
+import functools
+import numpy as np
+from .state import LevelTable
+from .transitions import Multiplet
+from .data import LazyRegistry
+
+__all__ = [
+    "read_linelist",
+    "read_levels_lines",
+    "build_multiplets",
+]
+
+LINE_COLUMNS = [
+    "species",
+    "E_lower", "J_lower", "L_lower", "S_lower",
+    "E_upper", "J_upper", "L_upper", "S_upper",
+    "log_gf",
+]
+LEVEL_COLUMNS = ["id", "species", "E", "J", "L", "S"]
+TRANSITION_COLUMNS = ["lower", "upper", "log_gf"]
+
+def _read_columns(path, required, optional=(), delimiter=",", strings=()):
+    """
+    Read the named columns of a delimited text file with a header line into
+    a dictionary of arrays. Columns named in 'strings' are read as text,
+    all others as floats.
+    """
+    with open(path) as f:
+        header = [name.strip() for name in f.readline().split(delimiter)]
+    missing = [name for name in required if name not in header]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+    names = list(required) + [name for name in optional if name in header]
+    #a structured dtype parses text and numeric columns in a single pass
+    dtype = [(name, object if name in strings else float) for name in names]
+    data = np.loadtxt(path, delimiter=delimiter, skiprows=1, ndmin=1,
+        usecols=[header.index(name) for name in names], dtype=dtype)
+    columns = {name : data[name] for name in names}
+    for name in strings:
+        if name in columns:
+            columns[name] = np.char.strip(columns[name].astype(str))
+    return columns
+
+def _codes(labels):
+    """
+    Integer codes for an array of text labels.
+    """
+    return np.unique(labels, return_inverse=True)[1].ravel()
+
+def _unique_rows(*columns):
+    """
+    Index of the first occurrence of each unique row of the given columns,
+    and the index of each row's unique row.
+    """
+    columns = [np.asarray(c) for c in columns]
+    order = np.lexsort(columns[::-1]) #stable, ordered by the first column
+    new = np.zeros(len(order), dtype=bool)
+    new[:1] = True
+    for c in columns:
+        new[1:] |= c[order][1:] != c[order][:-1]
+    inverse = np.empty(len(order), dtype=int)
+    inverse[order] = np.cumsum(new) - 1
+    return order[new], inverse
+
+def _term_symbol(L, twoS):
+    """
+    Term symbol such as '5D' for orbital angular momentum L and spin 2S.
+    """
+    return f"{twoS+1}{'SPDFGHIKLMNOQ'[L]}"
+
+def _wavenumber_bounds(levels, group, lower, upper, n_groups):
+    """
+    Multiplet.wavenumber_bounds of each group of lines, from the levels alone,
+    as arrays of (k_min, k_max, rate). k_min exceeds k_max for groups without
+    allowed transitions.
+    """
+    #distinct lower and upper levels of each group, ordered by group
+    lo, up = _unique_rows(group, lower)[0], _unique_rows(group, upper)[0]
+    g_lo, i_lo, i_up = group[lo], lower[lo], upper[up]
+    n_up = np.bincount(group[up], minlength=n_groups)
+
+    #every lower level paired with every upper level of its group
+    reps = n_up[g_lo]
+    g = np.repeat(g_lo, reps)
+    i_l = np.repeat(i_lo, reps)
+    offset = np.arange(len(g)) - np.repeat(np.cumsum(reps)-reps, reps)
+    i_u = i_up[(np.cumsum(n_up)-n_up)[g] + offset]
+
+    twoJl, twoJu = levels.twoJ[i_l], levels.twoJ[i_u]
+    allowed = (np.abs(twoJu-twoJl) <= 2) & ((twoJl != 0) | (twoJu != 0))
+    g, i_l, i_u = g[allowed], i_l[allowed], i_u[allowed]
+    k0 = levels.k0[i_u] - levels.k0[i_l]
+    Jg = levels.J * np.abs(levels.g)
+    k_min, k_max, rate = np.full(n_groups, np.inf), np.full(n_groups, -np.inf), np.zeros(n_groups)
+    np.minimum.at(k_min, g, k0)
+    np.maximum.at(k_max, g, k0)
+    np.maximum.at(rate, g, Jg[i_u] + Jg[i_l])
+    return k_min, k_max, 0.046686*rate
+
+def build_multiplets(levels, level_species, level_terms, lower, upper, log_gf):
+    """
+    Group transitions into Multiplets by species and the terms of their lower
+    and upper levels. 'levels' is a LevelTable, with the species and term
+    label of each level (terms may be empty strings, in which case levels
+    are grouped by L and S only). 'lower' and 'upper' are the level indices
+    of each transition. Returns a LazyRegistry of Multiplets named by species
+    and terms, e.g. 'Fe I 5F-5D', each of which is only constructed when it
+    is first accessed. Raises ValueError if two lower (or upper) levels of a
+    multiplet have the same J, or if two multiplets would have the same name.
+    """
+    lower, upper = np.asarray(lower, dtype=int), np.asarray(upper, dtype=int)
+    log_gf = np.asarray(log_gf, dtype=float)
+    term_id = _unique_rows(_codes(level_species), _codes(level_terms), levels.L,
+        levels.twoS)[1]
+    groups, inverse = _unique_rows(term_id[lower], term_id[upper])
+    order = np.argsort(inverse, kind='stable')
+    starts = np.searchsorted(inverse[order], np.arange(len(groups)+1))
+
+    lower, upper, log_gf = lower[order], upper[order], log_gf[order]
+    group = inverse[order]
+
+    #Multiplets pair every lower level with every upper level by J, so the
+    #levels on each side of a multiplet must have distinct J
+    for side, level in (("lower", lower), ("upper", upper)):
+        distinct = _unique_rows(group, level)[0]
+        first, pair = _unique_rows(group[distinct], levels.twoJ[level[distinct]])
+        counts = np.bincount(pair)
+        if np.any(counts > 1):
+            a, b = level[distinct][pair == np.argmax(counts > 1)][:2]
+            raise ValueError(f"Levels {a} and {b} with J={float(levels.twoJ[a]/2)} " \
+                f"are both {side} levels of a multiplet, term labels are needed to separate them")
+
+    #each J pair may only appear once within a multiplet
+    first, pair = _unique_rows(group, levels.twoJ[lower], levels.twoJ[upper])
+    counts = np.bincount(pair)
+    if np.any(counts > 1):
+        i = first[np.argmax(counts > 1)]
+        l, u = lower[i], upper[i]
+        key = (float(levels.twoJ[l]/2), float(levels.twoJ[u]/2))
+        raise ValueError(f"Duplicate J values {key} within a multiplet " \
+            f"including levels {l} and {u}, term labels are needed to separate them")
+
+    #Multiplets are only constructed when first accessed, sharing their States,
+    #but their wavelength bounds are known in advance for MultipletIndex
+    k_min, k_max, rate = (a.tolist() for a in _wavenumber_bounds(levels, group,
+        lower, upper, len(groups)))
+    states = {}
+    multiplets = LazyRegistry()
+    for g, l0, u0 in zip(range(len(groups)), lower[starts[:-1]].tolist(),
+        upper[starts[:-1]].tolist()):
+        lterm = level_terms[l0] or _term_symbol(levels.L[l0], levels.twoS[l0])
+        uterm = level_terms[u0] or _term_symbol(levels.L[u0], levels.twoS[u0])
+        name = f"{level_species[l0]} {lterm}-{uterm}"
+        if name in multiplets:
+            raise ValueError(f"Duplicate multiplet name '{name}', term labels " \
+                "must not coincide with the term symbols of unlabelled levels")
+        lines = slice(starts[g], starts[g+1])
+        bounds = None if k_min[g] > k_max[g] else (k_min[g], k_max[g], rate[g])
+        multiplets.register(name, functools.partial(_make_multiplet, levels, states,
+            lower[lines], upper[lines], log_gf[lines]), bounds)
+    return multiplets
+
+def _make_multiplet(levels, states, lower, upper, log_gf):
+    """
+    Multiplet for transitions between the levels with indices lower and
+    upper, reusing any States already in the dictionary 'states'.
+    """
+    def state(i):
+        if i not in states:
+            states[i] = levels[i]
+        return states[i]
+    J_lower, J_upper = (levels.twoJ[lower]/2).tolist(), (levels.twoJ[upper]/2).tolist()
+    return Multiplet(
+        Lower_states = [state(i) for i in sorted(set(lower.tolist()))],
+        Upper_states = [state(i) for i in sorted(set(upper.tolist()))],
+        log_gf = dict(zip(zip(J_lower, J_upper), log_gf.tolist())),
+    )
+
+def read_linelist(path, delimiter=","):
+    """
+    Read a line list from a delimited text file with a header line, with one
+    line per row, and group the lines into Multiplets (see build_multiplets).
+    The columns are
+
+    species, E_lower, J_lower, L_lower, S_lower,
+    E_upper, J_upper, L_upper, S_upper, log_gf
+
+    with energies in 1/cm, plus optional text columns term_lower and
+    term_upper to separate terms with the same L and S. Extracts from VALD
+    or NIST need to be converted to these columns, with the L and S of each
+    level taken from its LS term designation.
+    """
+    cols = _read_columns(path, LINE_COLUMNS, ["term_lower", "term_upper"],
+        delimiter, strings=["species", "term_lower", "term_upper"])
+    n = len(cols["log_gf"])
+    for side in ("lower", "upper"):
+        cols.setdefault(f"term_{side}", np.full(n, ""))
+
+    #identical levels appear in many lines, so deduplicate them
+    species = np.concatenate([cols["species"], cols["species"]])
+    terms = np.concatenate([cols["term_lower"], cols["term_upper"]])
+    E, J, L, S = (np.concatenate([cols[f"{q}_lower"], cols[f"{q}_upper"]]) for q in "EJLS")
+    first, inverse = _unique_rows(_codes(species), _codes(terms), E, J, L, S)
+    levels = LevelTable(E[first], J[first], L[first], S[first])
+    return build_multiplets(levels, species[first], terms[first], inverse[:n],
+        inverse[n:], cols["log_gf"])
+
+def read_levels_lines(levels_path, lines_path, delimiter=","):
+    """
+    Read NIST style separate files of levels and transitions, each with a
+    header line, and group the transitions into Multiplets (see
+    build_multiplets). The levels file has columns
+
+    id, species, E, J, L, S
+
+    with an optional text column 'term', and the lines file has columns
+
+    lower, upper, log_gf
+
+    where lower and upper are level ids.
+    """
+    lv = _read_columns(levels_path, LEVEL_COLUMNS, ["term"], delimiter,
+        strings=["species", "term"])
+    lv.setdefault("term", np.full(len(lv["id"]), ""))
+    tr = _read_columns(lines_path, TRANSITION_COLUMNS, delimiter=delimiter)
+
+    levels = LevelTable(lv["E"], lv["J"], lv["L"], lv["S"])
+    order = np.argsort(lv["id"])
+    sorted_ids = lv["id"][order]
+    index = {}
+    for side in ("lower", "upper"):
+        pos = np.minimum(np.searchsorted(sorted_ids, tr[side]), len(order)-1)
+        if np.any(sorted_ids[pos] != tr[side]):
+            raise ValueError(f"Unknown {side} level ids in {lines_path}")
+        index[side] = order[pos]
+    return build_multiplets(levels, lv["species"], lv["term"], index["lower"],
+        index["upper"], tr["log_gf"])
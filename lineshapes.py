@@ -0,0 +1,142 @@
+"""
+Normalised Voigt profiles, with a choice of exact or approximate methods.
+Profiles are parameterised as in scipy.special.voigt_profile, by the Gaussian
+standard deviation sigma and the Lorentzian half-width gamma.
+"""
+import functools
+import numpy as np
+from scipy.special import voigt_profile, wofz
+
+__all__ = [
+    "voigt",
+    "voigt_fwhm",
+    "voigt_derivatives",
+    "VOIGT_METHODS",
+]
+
+SQRT2 = np.sqrt(2)
+SQRT2PI = np.sqrt(2*np.pi)
+
+def voigt_fwhm(res_l, res_g):
+    """
+    Approximate FWHM of a Voigt profile from its Lorentzian and Gaussian
+    FWHMs, accurate to 0.02% (Olivero & Longbothum 1977).
+    """
+    return 0.5346*res_l + np.sqrt(0.2166*res_l**2 + res_g**2)
+
+def _faddeeva_humlicek(z):
+    """
+    Faddeeva function w(z) for Im(z) >= 0 from the four region rational
+    approximation of Humlíček (1982, JQSRT 27, 437).
+    """
+    x, y = z.real, z.imag
+    t = y - 1j*x
+    s = np.abs(x) + y
+    w = np.empty(z.shape, dtype=complex)
+
+    r1 = s >= 15
+    tt = t[r1]
+    w[r1] = tt*0.5641896/(0.5+tt*tt)
+
+    r2 = (s < 15) & (s >= 5.5)
+    tt = t[r2]
+    u = tt*tt
+    w[r2] = tt*(1.410474+u*0.5641896)/(0.75+u*(3+u))
+
+    r3 = (s < 5.5) & (y >= 0.195*np.abs(x)-0.176)
+    tt = t[r3]
+    w[r3] = (16.4955+tt*(20.20933+tt*(11.96482+tt*(3.778987+tt*0.5642236)))) \
+        / (16.4955+tt*(38.82363+tt*(39.27121+tt*(21.69274+tt*(6.699398+tt)))))
+
+    r4 = ~(r1 | r2 | r3)
+    tt = t[r4]
+    u = tt*tt
+    w[r4] = np.exp(u) - tt*(36183.31-u*(3321.9905-u*(1540.787-u*(219.0313-u \
+        *(35.76683-u*(1.320522-u*0.56419)))))) / (32066.6-u*(24322.84-u \
+        *(9022.228-u*(2186.181-u*(364.2191-u*(61.57037-u*(1.841439-u)))))))
+    return w
+
+def _voigt_faddeeva(faddeeva, x, sigma, gamma):
+    """
+    Voigt profile from an approximation to the Faddeeva function. Pure
+    Lorentzian or Gaussian profiles are evaluated exactly.
+    """
+    if sigma == 0 or gamma == 0:
+        return voigt_profile(x, sigma, gamma)
+    z = (np.asarray(x, dtype=float) + 1j*gamma)/(SQRT2*sigma)
+    return faddeeva(z).real/(SQRT2PI*sigma)
+
+def voigt_humlicek(x, sigma, gamma):
+    """
+    Voigt profile from Humlíček's W4 approximation.
+    """
+    return _voigt_faddeeva(_faddeeva_humlicek, x, sigma, gamma)
+
+@functools.lru_cache(maxsize=16)
+def _voigt_table(sigma, gamma, n_per_fwhm, n_fwhm):
+    """
+    Tabulated Voigt profile at |x| from 0 to n_fwhm FWHMs.
+    """
+    fwhm = voigt_fwhm(2*gamma, 2.355*sigma)
+    x_tab = np.linspace(0, n_fwhm*fwhm, n_fwhm*n_per_fwhm+1)
+    return x_tab, voigt_profile(x_tab, sigma, gamma)
+
+def voigt_table(x, sigma, gamma, n_per_fwhm=400, n_fwhm=100):
+    """
+    Voigt profile by linear interpolation of a table, computed once per
+    (sigma, gamma). Beyond the table the Lorentzian wing is used.
+    """
+    x_tab, v_tab = _voigt_table(float(sigma), float(gamma), n_per_fwhm, n_fwhm)
+    ax = np.abs(x)
+    V = np.interp(ax, x_tab, v_tab, right=0.)
+    if gamma > 0:
+        wing = gamma/(np.pi*(ax**2 + gamma**2 - 3*sigma**2))
+        V = np.where(ax > x_tab[-1], wing, V)
+    return V
+
+VOIGT_METHODS = {
+    "scipy" : voigt_profile,
+    "humlicek" : voigt_humlicek,
+    "table" : voigt_table,
+}
+
+def voigt(x, sigma, gamma, method="scipy", out=None):
+    """
+    Normalised Voigt profile with Gaussian standard deviation sigma and
+    Lorentzian half-width gamma, using one of the following methods, listed
+    with their maximum relative error:
+
+    scipy    : scipy.special.voigt_profile, exact to machine precision
+    humlicek : Humlíček (1982) W4 rational approximation, 1e-4
+    table    : interpolated table computed once per (sigma, gamma), 1e-4
+
+    The table method is several times faster than scipy when many profiles
+    share the same widths, as they do for the components of a multiplet.
+    The result is written into 'out' if it is given, which may be x itself.
+    """
+    try:
+        func = VOIGT_METHODS[method]
+    except KeyError:
+        raise ValueError(f"Unknown Voigt method '{method}'") from None
+    if out is None:
+        return func(x, sigma, gamma)
+    if func is voigt_profile:
+        return voigt_profile(x, sigma, gamma, out=out)
+    out[...] = func(x, sigma, gamma)
+    return out
+
+def voigt_derivatives(x, sigma, gamma):
+    """
+    Voigt profile and its partial derivatives with respect to x, sigma and
+    gamma, using the closed form derivative of the Faddeeva function,
+    w'(z) = -2zw(z) + 2i/sqrt(pi). Requires sigma > 0.
+    """
+    z = (np.asarray(x, dtype=float) + 1j*gamma)/(SQRT2*sigma)
+    w = wofz(z)
+    dw = -2*z*w + 2j/np.sqrt(np.pi)
+    norm = SQRT2PI*sigma
+    V = w.real/norm
+    dV_dx = dw.real/(norm*SQRT2*sigma)
+    dV_dgamma = -dw.imag/(norm*SQRT2*sigma)
+    dV_dsigma = -(dw*z).real/(norm*sigma) - V/sigma
+    return V, dV_dx, dV_dsigma, dV_dgamma
@@ -0,0 +1,56 @@
+"""
+Sharing compiled multiplets between processes through shared memory.
+"""
+import json
+from multiprocessing import shared_memory
+import numpy as np
+from .transitions import Multiplet
+
+__all__ = [
+    "share_multiplets",
+    "attach_multiplets",
+]
+
+def share_multiplets(multiplets):
+    """
+    Copy a dictionary of Multiplets, with their compiled tables, into a new
+    shared memory block, which can be attached by name in other processes
+    with attach_multiplets. The caller owns the block, and should close and
+    unlink it once the workers are finished.
+
+    Example:
+    >>> shm = share_multiplets(atomic_data)
+    >>> #in each worker process
+    >>> multiplets, worker_shm = attach_multiplets(shm.name)
+    """
+    buffers = [M.to_buffer() for M in multiplets.values()]
+    offsets = np.cumsum([0] + [len(b) for b in buffers]).tolist()
+    header = json.dumps({"names" : list(multiplets), "offsets" : offsets}).encode()
+    start = 8 + -(-len(header)//8)*8 #floats start 8 byte aligned
+    shm = shared_memory.SharedMemory(create=True, size=start + 8*offsets[-1])
+    np.ndarray(1, dtype=np.uint64, buffer=shm.buf)[0] = len(header)
+    shm.buf[8:8+len(header)] = header
+    data = np.ndarray(offsets[-1], dtype=float, buffer=shm.buf, offset=start)
+    for b, i in zip(buffers, offsets):
+        data[i:i+len(b)] = b
+    return shm
+
+def attach_multiplets(name):
+    """
+    Dictionary of the Multiplets placed in the shared memory block 'name' by
+    share_multiplets, together with the attached block. The component tables
+    are views of the shared memory, so are not copied, and the block must be
+    kept open while the Multiplets are in use.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: #track was added in python 3.13
+        shm = shared_memory.SharedMemory(name=name)
+    n_header = int(np.ndarray(1, dtype=np.uint64, buffer=shm.buf)[0])
+    header = json.loads(bytes(shm.buf[8:8+n_header]))
+    start = 8 + -(-n_header//8)*8
+    offsets = header["offsets"]
+    data = np.ndarray(offsets[-1], dtype=float, buffer=shm.buf, offset=start)
+    multiplets = {name : Multiplet.from_buffer(data[i:j])
+        for name, i, j in zip(header["names"], offsets[:-1], offsets[1:])}
+    return multiplets, shm
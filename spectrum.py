@@ -0,0 +1,98 @@
+"""
+Synthetic spectra built from many multiplets sharing one wavelength grid.
+"""
+import numpy as np
+from .transitions import ComponentTable
+from .synthesis import sum_profiles, cutoff_from_tolerance
+from .lineshapes import voigt_fwhm
+
+__all__ = ["SpectrumModel"]
+
+class SpectrumModel:
+    """
+    Model for a full spectrum containing several multiplets, each with its
+    own strength parameter. The compiled component tables of the multiplets
+    are concatenated, so that all components are evaluated together and their
+    opacities accumulated into a single array.
+
+    Example:
+    >>> model = SpectrumModel([atomic_data['Na D'], atomic_data['Ca HK']])
+    >>> flux = model.profile(500, x, [0.5, 1.2], 0.3, 0.2)
+    """
+    def __init__(self, multiplets):
+        self._set_tables([M.table for M in multiplets])
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        SpectrumModel from the compiled ComponentTables of the multiplets,
+        e.g. in worker processes that are only sent the tables.
+        """
+        self = cls.__new__(cls)
+        self._set_tables(list(tables))
+        return self
+
+    def _set_tables(self, tables):
+        self.tables = tables
+        self.table = ComponentTable.concatenate(self.tables)
+        self.n_components = np.array([len(tab) for tab in self.tables])
+        self.multiplet_index = np.repeat(np.arange(len(self.tables)), self.n_components)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def wavelength_ranges(self, B, rv=0):
+        """
+        Minimum and maximum wavelength [AA] of the components of each
+        multiplet at field strength B [kG]. Multiplets without any components
+        have a range of (inf, -inf).
+        """
+        x_lines = self.table.wavelengths(B) * (1 + rv/2.998e5)
+        w_min, w_max = np.full(len(self), np.inf), np.full(len(self), -np.inf)
+        nonempty = self.n_components > 0
+        starts = np.cumsum(self.n_components)[nonempty] - self.n_components[nonempty]
+        if len(starts):
+            w_min[nonempty] = np.minimum.reduceat(x_lines, starts)
+            w_max[nonempty] = np.maximum.reduceat(x_lines, starts)
+        return w_min, w_max
+
+    def opacity(self, B, x, strengths, res_l, res_g, psi=1, T=6000., rv=0,
+        margin=None, out=None, **kwargs):
+        """
+        Total opacity of all multiplets, scaled by their strengths. Multiplets
+        with no components within 'margin' [AA] of the range of x are
+        skipped. By default the margin is the truncation distance of the
+        profiles if 'cutoff' or 'rtol' is given, and 100 Voigt FWHMs
+        otherwise. The result is written into 'out' if it is given. Other
+        keyword arguments are passed to synthesis.sum_profiles.
+        """
+        x = np.asarray(x)
+        strengths = np.broadcast_to(np.asarray(strengths, dtype=float), (len(self),))
+        if margin is None:
+            cutoff = kwargs.get('cutoff')
+            if kwargs.get('rtol') is not None:
+                cutoff = cutoff_from_tolerance(kwargs['rtol'], res_l, res_g)
+            margin = (100 if cutoff is None else cutoff) * voigt_fwhm(res_l, res_g)
+
+        w_min, w_max = self.wavelength_ranges(B, rv)
+        keep = (w_max >= x.min()-margin) & (w_min <= x.max()+margin) & (strengths != 0)
+        mask = keep[self.multiplet_index]
+
+        tab = self.table
+        x_lines = tab.wavelengths(B)[mask] * (1 + rv/2.998e5)
+        weights = tab.boltzmann(B, T)[mask] * tab.gf[mask] \
+            * tab.rotation_factors(psi)[mask] * strengths[self.multiplet_index[mask]]
+        if out is not None:
+            out[...] = 0
+        return sum_profiles(x, x_lines, weights, res_l, res_g, out, **kwargs)
+
+    def profile(self, B, x, strengths, res_l, res_g, psi=1, T=6000., rv=0, **kwargs):
+        """
+        Calculates a synthetic spectrum of all multiplets in a magnetic field.
+        Arguments are as for Multiplet.profile, except that 'strengths' gives
+        one strength parameter per multiplet (or a single shared value).
+        Further keyword arguments are passed to SpectrumModel.opacity.
+        """
+        ylines = self.opacity(B, x, strengths, res_l, res_g, psi, T, rv, **kwargs)
+        ylines *= -1
+        return np.exp(ylines, out=ylines)
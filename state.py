@@ -9,6 +9,13 @@ import numpy as np
 
 SubState = namedtuple("SubState", "mJ k")
 
+@functools.lru_cache(maxsize=None)
+def _half(n):
+    """
+    Fraction n/2, cached as Fraction construction is slow.
+    """
+    return Fraction(n, 2)
+
 class State:
     """
     This class is an energy level requiring 4 quantities:
@@ -21,8 +28,10 @@ class State:
     Example:
     >>> LVL = State(15000., 1.5, 2, 0.5)
 
-    On intitialisation, the class variable 'g', the Lande-g factor
-    is also calculated and can get be accessed as LVL.g
+    J and S are stored doubled as integers (LVL.twoJ, LVL.twoS), and are
+    available as fractions as LVL.J and LVL.S. On intitialisation the
+    Lande-g factor is also calculated as a float, LVL.g_float, and can be
+    accessed as a fraction as LVL.g
 
     Various methods are included to calculate perturbations of
     energy levels in a 'weak' magnetic field:
@@ -31,27 +40,66 @@ class State:
     LVL.splittings(B)
     LVL.energy(mJ, B)
     LVL.energies(B)
+    LVL.splitting_array(B)
+    LVL.energy_array(B)
 
     'splittings' and 'energies' do not require an mJ value,
-    but return a list of (mJ, dk) or (mJ, k) tuples.
+    but return a list of (mJ, dk) or (mJ, k) tuples. 'splitting_array'
+    and 'energy_array' instead return float arrays ordered by mJ, and
+    broadcast over an array of field strengths.
     """
+    __slots__ = ("k0", "twoJ", "L", "twoS", "g_float", "_mJ_array")
+
     def __init__(self, k0, J, L, S):
+        twoJ, twoS = 2*Fraction(J), 2*Fraction(S)
+        if any(X < 0 for X in (twoJ, L, twoS)):
+            raise ValueError("JLS must be non-negative")
+        if twoJ.denominator != 1 or twoS.denominator != 1 \
+            or twoJ not in range(abs(2*int(L)-int(twoS)), 2*int(L)+int(twoS)+1, 2):
+            raise ValueError("Invalid JLS combination")
+        self._set(k0, int(twoJ), L, int(twoS))
+
+    def _set(self, k0, twoJ, L, twoS):
+        """
+        Set the slots from doubled J and S, calculating the g-factor as a float.
+        """
         self.k0 = float(k0)
-        self.J = Fraction(J)
+        self.twoJ = twoJ
         self.L = int(L)
-        self.S = Fraction(S)
+        self.twoS = twoS
+        self._mJ_array = None
+        if twoS == 0:
+            self.g_float = 1.
+        elif self.L == 0:
+            self.g_float = 2.
+        elif 2*self.L == twoS:
+            self.g_float = 1.5
+        elif twoJ == 0:
+            self.g_float = 0.
+        else:
+            #4J(J+1) etc. are integers, so this matches float(self.g) exactly
+            JJ1, LL1, SS1 = twoJ*(twoJ+2), 4*self.L*(self.L+1), twoS*(twoS+2)
+            self.g_float = (3*JJ1 + SS1 - LL1) / (2*JJ1)
 
-        if any(X < 0 for X in self.JLS):
-            raise ValueError("JLS must be non-negative")
-        if self.J not in np.arange(abs(self.L-self.S), self.L+self.S+1):
-            raise ValueError("Invalid JLS combination")
+    @classmethod
+    def _unchecked(cls, k0, twoJ, L, twoS):
+        """
+        Construct a State from doubled J and S without validating them, which
+        must already have been checked, e.g. by LevelTable.
+        """
+        self = cls.__new__(cls)
+        self._set(k0, twoJ, L, twoS)
+        return self
+
+    def __getstate__(self):
+        return self.k0, self.twoJ, self.L, self.twoS
 
+    def __setstate__(self, state):
+        self._set(*state)
 
     def __repr__(self):
-        Jdiv2 = "/2" if self.J.denominator == 2 else ""
-        Sdiv2 = "/2" if self.S.denominator == 2 else ""
-        Jstr = f"{self.J.numerator}{Jdiv2}"
-        Sstr = f"{self.S.numerator}{Sdiv2}"
+        Jstr = f"{self.twoJ}/2" if self.twoJ % 2 else f"{self.twoJ//2}"
+        Sstr = f"{self.twoS}/2" if self.twoS % 2 else f"{self.twoS//2}"
         return f"State({self.k0}, {Jstr}, {self.L}, {Sstr})"
 
     def __str__(self):
@@ -68,26 +116,34 @@ class State:
         jj = f"{sublist[self.J.numerator]}{div2}"
         return f"|{ss}{ll}{jj}⟩"
 
+    @property
+    def J(self):
+        return _half(self.twoJ)
+
+    @property
+    def S(self):
+        return _half(self.twoS)
+
     @property
     def J_multiplicity(self):
-        return int(2*self.J+1)
+        return self.twoJ+1
 
     @property
     def S_multiplicity(self):
-        return int(2*self.S+1)
+        return self.twoS+1
 
-    @functools.cached_property
+    @property
     def g(self):
         """
         Lande g-factor. Calculated as a fraction.
         """
-        if self.S == 0:
+        if self.twoS == 0:
             return Fraction(1, 1)
         if self.L == 0:
             return Fraction(2, 1)
-        if self.L == self.S:
+        if 2*self.L == self.twoS:
             return Fraction(3, 2)
-        if self.J == 0:
+        if self.twoJ == 0:
             return Fraction(0, 1)
         JJ1, LL1, SS1 = (X*(X+1) for X in self.JLS)
         return 1 + (JJ1 + SS1 - LL1) / (2*JJ1)
@@ -104,13 +160,22 @@ class State:
         """
         Property to get all values of mJ between -mJ and +mJ
         """
-        return np.arange(-self.J, self.J+1)
+        return np.array([_half(m) for m in range(-self.twoJ, self.twoJ+1, 2)], dtype=object)
+
+    @property
+    def mJ_array(self):
+        """
+        Values of mJ between -mJ and +mJ as a float array, computed once.
+        """
+        if self._mJ_array is None:
+            self._mJ_array = np.arange(-self.twoJ, self.twoJ+1, 2)/2
+        return self._mJ_array
 
     def splitting(self, mJ, B):
         """
         For a specific mJ and field strength B in kG, calculate the energy shift in 1/cm
         """
-        return 0.046686 * B * float(mJ * self.g)
+        return 0.046686 * B * float(mJ) * self.g_float
 
     def splittings(self, B):
         """
@@ -131,3 +196,97 @@ class State:
         for all substates mJ
         """
         return [SubState(mJ, self.energy(mJ, B)) for mJ in self.mJs]
+
+    def splitting_array(self, B):
+        """
+        For a field strength B in kG, calculate the energy shifts in 1/cm for
+        all substates mJ as an array. If B is an array, the result has shape
+        (n_B, n_mJ).
+        """
+        return 0.046686 * np.multiply.outer(B, self.mJ_array * self.g_float)
+
+    def energy_array(self, B):
+        """
+        For a field strength B in kG, calculate the total energies in 1/cm for
+        all substates mJ as an array. If B is an array, the result has shape
+        (n_B, n_mJ).
+        """
+        return self.k0 + self.splitting_array(B)
+
+class LevelTable:
+    """
+    Many energy levels stored as parallel arrays, for bulk atomic data. J and
+    S are stored doubled, as integers (twoJ, twoS). All levels are validated
+    together on initialisation, rather than one at a time as by State.
+
+    Example:
+    >>> levels = LevelTable([0., 16956.17, 16973.37], [1/2, 1/2, 3/2], [0, 1, 1], 1/2)
+    >>> levels[2]
+    State(16973.37, 3/2, 1, 1/2)
+    """
+    def __init__(self, k0, J, L, S):
+        k0, J, L, S = np.broadcast_arrays(np.asarray(k0, dtype=float),
+            np.asarray(J, dtype=float), np.asarray(L), np.asarray(S, dtype=float))
+        self.k0 = k0.copy()
+        self.twoJ = np.rint(2*J).astype(int)
+        self.L = L.astype(int)
+        self.twoS = np.rint(2*S).astype(int)
+
+        bad = (2*J != self.twoJ) | (2*S != self.twoS) | (L != self.L)
+        if np.any(bad):
+            raise ValueError(f"Non half-integer J or S, or non-integer L, at level {np.argmax(bad)}")
+        bad = (self.twoJ < 0) | (self.L < 0) | (self.twoS < 0)
+        if np.any(bad):
+            raise ValueError(f"JLS must be non-negative, at level {np.argmax(bad)}")
+        twoJ_min, twoJ_max = np.abs(2*self.L-self.twoS), 2*self.L+self.twoS
+        bad = (self.twoJ < twoJ_min) | (self.twoJ > twoJ_max) | ((self.twoJ-twoJ_min) % 2 != 0)
+        if np.any(bad):
+            raise ValueError(f"Invalid JLS combination at level {np.argmax(bad)}")
+
+    @classmethod
+    def from_states(cls, states):
+        """
+        LevelTable of a sequence of State objects.
+        """
+        self = cls.__new__(cls)
+        self.k0 = np.array([S.k0 for S in states], dtype=float)
+        self.twoJ = np.array([S.twoJ for S in states], dtype=int)
+        self.L = np.array([S.L for S in states], dtype=int)
+        self.twoS = np.array([S.twoS for S in states], dtype=int)
+        return self
+
+    def __len__(self):
+        return len(self.k0)
+
+    def __getitem__(self, i):
+        return State._unchecked(self.k0[i], int(self.twoJ[i]), self.L[i],
+            int(self.twoS[i]))
+
+    @property
+    def J(self):
+        return self.twoJ/2
+
+    @property
+    def S(self):
+        return self.twoS/2
+
+    @property
+    def g(self):
+        """
+        Lande g-factors of all levels as floats, as for State.g_float
+        """
+        twoJ, L, twoS = self.twoJ, self.L, self.twoS
+        JJ1, LL1, SS1 = twoJ*(twoJ+2), 4*L*(L+1), twoS*(twoS+2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = (3*JJ1 + SS1 - LL1) / (2*JJ1)
+        g = np.where(twoJ == 0, 0., g)
+        g = np.where(2*L == twoS, 1.5, g)
+        g = np.where(L == 0, 2., g)
+        g = np.where(twoS == 0, 1., g)
+        return g
+
+    def states(self):
+        """
+        List of State objects for all levels.
+        """
+        return [self[i] for i in range(len(self))]
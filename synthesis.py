@@ -0,0 +1,321 @@
+"""
+Routines for summing the Voigt profiles of many line components onto a
+wavelength grid.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.special import voigt_profile
+from .lineshapes import voigt, voigt_fwhm
+
+__all__ = [
+    "cutoff_from_tolerance",
+    "uniform_coordinate",
+    "strong_components",
+    "merge_components",
+    "sum_profiles",
+    "sum_profiles_fft",
+    "sum_profiles_batch",
+    "thread_pool",
+]
+
+_scratch = threading.local()
+_pools = {}
+_pools_lock = threading.Lock()
+
+def scratch_buffer(n):
+    """
+    Temporary array of n floats, reused across calls within each thread so
+    that repeated model evaluations do not allocate large arrays.
+    """
+    buf = getattr(_scratch, 'buf', None)
+    if buf is None or len(buf) < n:
+        buf = _scratch.buf = np.empty(n)
+    return buf[:n]
+
+def thread_pool(workers=None):
+    """
+    Shared ThreadPoolExecutor with the given number of workers (by default
+    the number of CPUs), created on first use and reused by later calls.
+    """
+    workers = workers or os.cpu_count()
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix="magnetic")
+        return _pools[workers]
+
+def cutoff_from_tolerance(rtol, res_l, res_g):
+    """
+    Distance from a line centre, in units of the Voigt FWHM, beyond which the
+    profile has dropped below a fraction rtol of its peak value. The larger of
+    the Gaussian core and Lorentzian wing estimates is used.
+    """
+    sigma, gamma = res_g/2.355, res_l/2
+    peak = voigt_profile(0., sigma, gamma)
+    d_gauss = sigma * np.sqrt(2*np.log(1/rtol))
+    d_lorentz = np.sqrt(gamma/(np.pi*rtol*peak)) if gamma > 0 else 0.
+    return max(d_gauss, d_lorentz) / voigt_fwhm(res_l, res_g)
+
+def uniform_coordinate(x, rtol=1e-6):
+    """
+    For a wavelength grid x, return the coordinate in which it is uniformly
+    spaced, either x itself or log(x). None is returned for any other grid.
+    """
+    x = np.asarray(x)
+    if len(x) < 3:
+        return None
+    coords = (x, np.log(x)) if x[0] > 0 else (x,)
+    for u in coords:
+        du = np.diff(u)
+        if du[0] > 0 and np.all(np.abs(du-du[0]) <= rtol*du[0]):
+            return u
+    return None
+
+def strong_components(weights, min_strength, relative=True):
+    """
+    Boolean mask of the components whose weight is at least min_strength,
+    relative to the strongest component unless relative is False. If weights
+    has several rows (e.g. for an array of field strengths), components are
+    kept if they are strong enough in any row.
+    """
+    weights = np.asarray(weights)
+    threshold = min_strength * np.max(weights, initial=0.) if relative else min_strength
+    keep = weights >= threshold
+    return keep.reshape(-1, keep.shape[-1]).any(axis=0)
+
+def merge_components(centres, weights, tol):
+    """
+    Merge components whose centres lie within tol [AA] of each other into
+    single components at their weighted mean centre, with their summed
+    weight. Components are grouped in order of wavelength, each group
+    spanning at most tol, so tol=0 only merges coincident components.
+    """
+    order = np.argsort(centres, kind='stable')
+    centres, weights = np.asarray(centres)[order], np.asarray(weights)[order]
+    starts, i = [], 0
+    while i < len(centres):
+        starts.append(i)
+        i = np.searchsorted(centres, centres[i]+tol, side='right')
+    if len(starts) == len(centres):
+        return centres, weights
+    total = np.add.reduceat(weights, starts)
+    moment = np.add.reduceat(weights*centres, starts)
+    merged = centres[starts]
+    nonzero = total != 0
+    merged[nonzero] = moment[nonzero]/total[nonzero]
+    return merged, total
+
+def _sum_profiles_parallel(x, centres, weights, res_l, res_g, out, workers,
+    executor, split, min_chunk=4096, **kwargs):
+    """
+    sum_profiles evaluated in chunks of x, or of the components, on a thread
+    pool. Chunks of x are written directly into their slices of out, while
+    chunks of components are summed into out in order as they finish.
+    """
+    n_chunks = workers or os.cpu_count()
+    if executor is None:
+        executor = thread_pool(workers)
+    if split is None:
+        split = "components" if kwargs["engine"] == "fft" else "x"
+    if split == "x":
+        if kwargs["engine"] == "fft":
+            raise ValueError("engine='fft' can only be split by components")
+        bounds = np.linspace(0, len(x), min(n_chunks, max(1, len(x)//min_chunk))+1).astype(int)
+        futures = [executor.submit(sum_profiles, x[a:b], centres, weights, res_l,
+            res_g, out[a:b], **kwargs) for a, b in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            future.result()
+    elif split == "components":
+        chunks = np.array_split(np.arange(np.shape(centres)[-1]), n_chunks)
+        futures = [executor.submit(sum_profiles, x, centres[..., c], weights[..., c],
+            res_l, res_g, **kwargs) for c in chunks if len(c)]
+        for future in futures:
+            out += future.result()
+    else:
+        raise ValueError(f"Unknown split '{split}'")
+    return out
+
+def sum_profiles(x, centres, weights, res_l, res_g, out=None, cutoff=None,
+    rtol=None, tails=False, engine="direct", voigt_method="scipy", workers=None,
+    executor=None, split=None):
+    """
+    Sum of Voigt profiles centred on 'centres' [AA] and scaled by 'weights',
+    evaluated on the wavelengths x [AA]. res_l and res_g are the Lorentzian and
+    Gaussian FWHMs [AA]. The sum is added in place into 'out' if it is given,
+    and intermediate profiles use a reusable scratch buffer.
+
+    If 'cutoff' is set, each profile is only evaluated within that many Voigt
+    FWHMs of its centre. Alternatively, 'rtol' sets the cutoff to where the
+    profile drops below that fraction of its peak. Windowing requires x to be
+    sorted in ascending order. With 'tails' enabled, the Lorentzian wings
+    beyond each window are added analytically.
+
+    With engine="fft", the weights are binned onto the grid as a stick
+    spectrum and convolved with a single Voigt kernel, see sum_profiles_fft.
+    This is only possible for grids uniform in x or log(x), otherwise the
+    direct sum is used.
+
+    voigt_method selects how the Voigt profiles are calculated, see
+    lineshapes.voigt for the options and their accuracy.
+
+    With 'workers' or an 'executor' (e.g. from thread_pool), the work is split
+    into chunks evaluated concurrently by threads, as numpy and scipy release
+    the GIL for large arrays. split="x" divides the wavelength grid between
+    the threads, which gives identical results to the serial sum, while
+    split="components" divides the components and is needed for engine="fft".
+    By default, the components are split for engine="fft" and x otherwise.
+    """
+    x = np.asarray(x)
+    if out is None:
+        out = np.zeros(x.shape)
+    if workers is not None or executor is not None:
+        centres, weights = np.asarray(centres), np.asarray(weights)
+        return _sum_profiles_parallel(x, centres, weights, res_l, res_g, out,
+            workers, executor, split, cutoff=cutoff, rtol=rtol, tails=tails,
+            engine=engine, voigt_method=voigt_method)
+    sigma, gamma = res_g/2.355, res_l/2
+
+    if rtol is not None:
+        cutoff = cutoff_from_tolerance(rtol, res_l, res_g)
+    if engine == "fft":
+        return sum_profiles_fft(x, centres, weights, res_l, res_g, out, cutoff,
+            voigt_method)
+    if engine != "direct":
+        raise ValueError(f"Unknown engine '{engine}'")
+    if cutoff is None:
+        tmp = scratch_buffer(x.size).reshape(x.shape)
+        for centre, weight in zip(centres, weights):
+            np.subtract(x, centre, out=tmp)
+            voigt(tmp, sigma, gamma, voigt_method, out=tmp)
+            tmp *= weight
+            out += tmp
+        return out
+
+    if np.any(x[1:] < x[:-1]):
+        raise ValueError("x must be sorted for windowed profiles")
+    half_width = cutoff * voigt_fwhm(res_l, res_g)
+    centres = np.asarray(centres)
+    i_lo = np.searchsorted(x, centres-half_width, side='left')
+    i_hi = np.searchsorted(x, centres+half_width, side='right')
+    buf = scratch_buffer(len(x))
+    for centre, weight, lo, hi in zip(centres, weights, i_lo, i_hi):
+        if hi > lo:
+            tmp = buf[:hi-lo]
+            np.subtract(x[lo:hi], centre, out=tmp)
+            voigt(tmp, sigma, gamma, voigt_method, out=tmp)
+            tmp *= weight
+            out[lo:hi] += tmp
+        if tails and gamma > 0:
+            for wing in (slice(None, lo), slice(hi, None)):
+                tmp = buf[wing]
+                np.subtract(x[wing], centre, out=tmp)
+                np.square(tmp, out=tmp)
+                tmp += gamma**2
+                np.divide(weight*gamma/np.pi, tmp, out=tmp)
+                out[wing] += tmp
+    return out
+
+def sum_profiles_fft(x, centres, weights, res_l, res_g, out=None, cutoff=None,
+    voigt_method="scipy"):
+    """
+    FFT implementation of sum_profiles. Each component is split linearly
+    between its two neighbouring pixels of a stick spectrum, which is then
+    convolved once with the Voigt profile, at a cost of O(N log N)
+    independent of the number of components. This is accurate when the
+    Voigt FWHM spans several pixels.
+
+    On a log-uniform grid the kernel is evaluated at the central wavelength
+    of the grid, so the line widths have a fractional error up to half the
+    fractional span of the grid. Components too far outside the grid to be
+    binned, and grids that are not uniform, use the direct sum instead.
+
+    'centres' and 'weights' may also have shape (n_rows, n_components), in
+    which case all rows are convolved together into an (n_rows, n_x) array,
+    as for sum_profiles_batch.
+    """
+    from scipy.signal import fftconvolve #slow to import, so only when needed
+    x = np.asarray(x)
+    centres, weights = np.asarray(centres), np.asarray(weights)
+    if out is None:
+        out = np.zeros(centres.shape[:-1] + x.shape)
+    if (u := uniform_coordinate(x)) is None:
+        if centres.ndim == 2:
+            return sum_profiles_batch(x, centres, weights, res_l, res_g, out,
+                voigt_method=voigt_method)
+        return sum_profiles(x, centres, weights, res_l, res_g, out, cutoff,
+            voigt_method=voigt_method)
+
+    N = len(x)
+    du = (u[-1]-u[0])/(N-1)
+    is_log = u is not x
+    scale = x[N//2] if is_log else 1. #AA per unit u
+
+    if cutoff is None:
+        pad = N
+        half_kernel = N + pad - 1
+    else:
+        pad = int(np.ceil(cutoff*voigt_fwhm(res_l, res_g)/(du*scale))) + 1
+        half_kernel = pad
+
+    n_sticks = N + 2*pad
+    centres2, weights2 = np.atleast_2d(centres), np.atleast_2d(weights)
+    n_rows = len(centres2)
+    f = ((np.log(centres2) if is_log else centres2) - u[0])/du + pad
+    binned = (f >= 0) & (f < n_sticks-1)
+    row = np.nonzero(binned)[0]
+    j = np.floor(f[binned]).astype(int) + row*n_sticks
+    t = f[binned] - np.floor(f[binned])
+    w = weights2[binned]
+    n_total = n_rows*n_sticks
+    sticks = np.bincount(j, w*(1-t), minlength=n_total) \
+        + np.bincount(j+1, w*t, minlength=n_total)
+    sticks = sticks.reshape(n_rows, n_sticks)
+
+    offsets = np.arange(-half_kernel, half_kernel+1) * du * scale
+    kernel = voigt(offsets, res_g/2.355, res_l/2, voigt_method)
+    i0 = pad + half_kernel
+    out2 = out.reshape(n_rows, N)
+    out2 += fftconvolve(sticks, kernel[None,:], axes=-1)[:,i0:i0+N]
+
+    for i in np.nonzero(~np.all(binned, axis=1))[0]:
+        sum_profiles(x, centres2[i][~binned[i]], weights2[i][~binned[i]], res_l,
+            res_g, out2[i], cutoff, voigt_method=voigt_method)
+    return out
+
+def sum_profiles_batch(x, centres, weights, res_l, res_g, out=None,
+    block_size=2**22, engine="direct", cutoff=None, voigt_method="scipy"):
+    """
+    Batched version of sum_profiles for many sets of components, e.g. for a
+    grid of field strengths. 'centres' and 'weights' have shape
+    (n_rows, n_components), and the profiles are added into an array of shape
+    (n_rows, n_x). Each component is evaluated for all rows at once, in blocks
+    of rows of at most 'block_size' pixels to bound temporary memory. With
+    engine="fft" the stick spectra of all rows are instead convolved together,
+    with the kernel optionally truncated at 'cutoff' FWHMs, see
+    sum_profiles_fft.
+    """
+    x = np.asarray(x)
+    centres, weights = np.atleast_2d(centres), np.atleast_2d(weights)
+    n_rows = len(centres)
+    if out is None:
+        out = np.zeros((n_rows, len(x)))
+    elif out.shape != (n_rows, len(x)):
+        raise ValueError("out must have shape (n_rows, n_x)")
+    if engine == "fft":
+        return sum_profiles_fft(x, centres, weights, res_l, res_g, out, cutoff,
+            voigt_method=voigt_method)
+    if engine != "direct":
+        raise ValueError(f"Unknown engine '{engine}'")
+    sigma, gamma = res_g/2.355, res_l/2
+
+    n_block = max(1, block_size // max(len(x), 1))
+    for i0 in range(0, n_rows, n_block):
+        block = out[i0:i0+n_block]
+        V = scratch_buffer(block.size).reshape(block.shape)
+        for centre, weight in zip(centres[i0:i0+n_block].T, weights[i0:i0+n_block].T):
+            np.subtract(x, centre[:,None], out=V)
+            voigt(V, sigma, gamma, voigt_method, out=V)
+            V *= weight[:,None]
+            block += V
+    return out
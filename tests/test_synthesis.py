@@ -0,0 +1,31 @@
+"""
+Accuracy of the FFT synthesis engine against the direct sum of profiles.
+"""
+import numpy as np
+from magnetic import atomic_data
+from magnetic.synthesis import sum_profiles
+
+def components(B=500., T=6000.):
+    tab = atomic_data['Fe 5300'].table
+    return tab.wavelengths(B), tab.gf * tab.boltzmann(B, T)
+
+def relative_error(x):
+    centres, weights = components()
+    direct = sum_profiles(x, centres, weights, 0.3, 0.2)
+    fft = sum_profiles(x, centres, weights, 0.3, 0.2, engine="fft")
+    return np.max(np.abs(fft-direct)) / np.max(direct)
+
+def test_fft_linear_grid():
+    assert relative_error(np.linspace(5250, 5500, 20000)) < 1e-3
+
+def test_fft_log_grid():
+    #line widths are only exact at the centre of a log-uniform grid, with a
+    #fractional error up to half the fractional span of the grid (~2%)
+    assert relative_error(np.geomspace(5250, 5500, 20000)) < 2e-2
+
+def test_fft_nonuniform_grid_falls_back_to_direct():
+    x = np.sort(np.random.default_rng(0).uniform(5250, 5500, 5000))
+    centres, weights = components()
+    direct = sum_profiles(x, centres, weights, 0.3, 0.2)
+    fft = sum_profiles(x, centres, weights, 0.3, 0.2, engine="fft")
+    assert np.array_equal(fft, direct)
@@ -2,20 +2,126 @@
 Contains a class for dealing with multiplets between an levels, determining the
 Zeeman splitting, and constructing synthetic line profiles.
 """
+import os
+import hashlib
+import tempfile
+import functools
 from itertools import product
 from collections import defaultdict
 from typing import List, Dict
 import numpy as np
 from scipy.special import voigt_profile
 from .state import State
+from .synthesis import sum_profiles, sum_profiles_batch, strong_components, merge_components, \
+    cutoff_from_tolerance
+from .lineshapes import voigt_derivatives, voigt_fwhm
 
-__all__ = ["Multiplet"]
+__all__ = [
+    "Multiplet",
+    "ComponentTable",
+]
+
+def _default_log_gf():
+    """
+    log(gf) of transitions missing from a multiplet's log_gf dictionary. This
+    is a module level function, rather than a lambda, so Multiplets pickle.
+    """
+    return -10.0
+
+class ComponentTable:
+    """
+    Compiled table of the allowed Zeeman components of a multiplet, stored as
+    a struct-of-arrays. Each row of 'data' is one of the FIELDS:
+
+    k0       : wavenumber of the component at B=0 (cm-1)
+    dk       : shift of the component wavenumber per kG (cm-1/kG)
+    k_lower  : energy of the lower level at B=0 (cm-1)
+    dk_lower : shift of the lower level energy per kG (cm-1/kG)
+    gf       : oscillator strength of the component
+    dmJ      : change in mJ for the transition
+    i_lower  : index of the lower state in the multiplet
+    i_upper  : index of the upper state in the multiplet
+
+    Evaluating the components at a new field strength is then only a few
+    numpy expressions.
+    """
+    FIELDS = ("k0", "dk", "k_lower", "dk_lower", "gf", "dmJ", "i_lower", "i_upper")
+    VERSION = 1 #increment when FIELDS or their meaning change
+
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=float).reshape(len(self.FIELDS), -1)
+
+    def save(self, path):
+        """
+        Save the table as a .npy file. The file is written to a temporary
+        name first, so other processes never see a partially written table.
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, self.data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a table saved with ComponentTable.save. With mmap, the file is
+        memory mapped read-only, so that processes loading the same table
+        share its pages.
+        """
+        return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Join several tables into one, e.g. the components of many multiplets.
+        """
+        return cls(np.hstack([tab.data for tab in tables]))
+
+    def __getattr__(self, name):
+        if name in self.FIELDS:
+            return self.data[self.FIELDS.index(name)]
+        raise AttributeError(name)
+
+    def wavenumbers(self, B):
+        """
+        Component wavenumbers (cm-1) for a field strength B in kG. If B is an
+        array, the component axis is appended as the last axis.
+        """
+        return self.k0 + np.multiply.outer(B, self.dk)
+
+    def wavelengths(self, B):
+        """
+        Component vacuum wavelengths [AA] for a field strength B in kG.
+        """
+        return 1e8/self.wavenumbers(B)
+
+    def boltzmann(self, B, T):
+        """
+        Boltzmann factors of the lower levels for a field strength B in kG
+        and temperature T in K.
+        """
+        k_lower = self.k_lower + np.multiply.outer(B, self.dk_lower)
+        return np.exp(-k_lower/(0.695*T))
+
+    def rotation_factors(self, psi):
+        """
+        Relative strengths of pi and sigma components for a viewing angle psi
+        (radians) between the field and the line of sight. If psi is an array,
+        the component axis is appended as the last axis.
+        """
+        psi = np.expand_dims(psi, -1)
+        cos2psi, sin2psi = np.cos(psi)**2, np.sin(psi)**2
+        return np.where(self.dmJ == 0, sin2psi, 1+cos2psi)
 
 class Multiplet:
     """
     Multiplet class, containing lists of lower and upper states, and oscillator
     strengths (log[gf]) between them.
     """
+    JACOBIAN_PARAMS = ("B", "strength", "res_l", "res_g", "psi", "rv")
 
     def __init__(self,
         Lower_states: List[State],
@@ -25,6 +131,8 @@ class Multiplet:
         self.Lower_states = Lower_states
         self.Upper_states = Upper_states
         self.log_gf = log_gf
+        self._table = None
+        self._zero_field_table = None
 
     @property
     def Upper_and_Lower_states(self):
@@ -43,7 +151,106 @@ class Multiplet:
 
     @log_gf.setter
     def log_gf(self, value):
-        self._log_gf = defaultdict(lambda: -10.0, value)
+        self._log_gf = defaultdict(_default_log_gf, value)
+        self._table = None
+        self._zero_field_table = None
+
+    @property
+    def table(self):
+        """
+        Compiled ComponentTable of the multiplet. This is built on first
+        access, see Multiplet.compile.
+        """
+        if self._table is None:
+            self.compile()
+        return self._table
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_zero_field_table"] = None #cheap to rebuild
+        return state
+
+    def to_buffer(self):
+        """
+        The states, oscillator strengths and compiled table of the multiplet
+        as a flat float array, e.g. for placing in shared memory, see
+        Multiplet.from_buffer.
+        """
+        tab = self.table
+        lower = [(S.k0, S.twoJ, S.L, S.twoS) for S in self.Lower_states]
+        upper = [(S.k0, S.twoJ, S.L, S.twoS) for S in self.Upper_states]
+        gf = [(float(Jl), float(Ju), v) for (Jl, Ju), v in self._log_gf.items()]
+        header = [ComponentTable.VERSION, len(lower), len(upper), len(gf), len(tab)]
+        return np.concatenate([header, np.ravel(lower), np.ravel(upper),
+            np.ravel(gf), tab.data.ravel()])
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """
+        Reconstruct a Multiplet from the output of Multiplet.to_buffer. The
+        compiled table is a view of buf rather than a copy, so buf must be
+        kept alive, e.g. a shared memory block must stay open.
+        """
+        buf = np.asarray(buf, dtype=float)
+        version, n_lower, n_upper, n_gf, n_comp = (int(v) for v in buf[:5])
+        if version != ComponentTable.VERSION:
+            raise ValueError(f"Buffer has ComponentTable version {version}, " \
+                f"expected {ComponentTable.VERSION}")
+        i = 5
+        def take(n, width):
+            nonlocal i
+            block = buf[i:i+n*width].reshape(n, width)
+            i += n*width
+            return block
+        lower, upper = take(n_lower, 4), take(n_upper, 4)
+        gf = take(n_gf, 3)
+        self = cls(
+            Lower_states = [State._unchecked(k0, int(twoJ), L, int(twoS)) \
+                for k0, twoJ, L, twoS in lower.tolist()],
+            Upper_states = [State._unchecked(k0, int(twoJ), L, int(twoS)) \
+                for k0, twoJ, L, twoS in upper.tolist()],
+            log_gf = {(Jl, Ju) : v for Jl, Ju, v in gf.tolist()},
+        )
+        self._table = ComponentTable(take(len(ComponentTable.FIELDS), n_comp))
+        return self
+
+    @property
+    def zero_field_table(self):
+        """
+        ComponentTable for zero field, with the components of each pair of
+        states summed into two rows, a pi row (dmJ=0) and a sigma row
+        (dmJ=1), which have the same wavelength.
+        """
+        if self._zero_field_table is None:
+            tab = self.table
+            pairs, inverse = np.unique(np.column_stack([tab.i_lower, tab.i_upper]),
+                axis=0, return_inverse=True)
+            row = 2*inverse.ravel() + (tab.dmJ != 0)
+            first = np.unique(inverse.ravel(), return_index=True)[1]
+            data = np.zeros((len(ComponentTable.FIELDS), 2*len(pairs)))
+            for field in ("k0", "k_lower", "i_lower", "i_upper"):
+                data[ComponentTable.FIELDS.index(field)] = np.repeat(getattr(tab, field)[first], 2)
+            data[ComponentTable.FIELDS.index("gf")] = np.bincount(row, tab.gf, 2*len(pairs))
+            data[ComponentTable.FIELDS.index("dmJ")] = np.tile([0., 1.], len(pairs))
+            self._zero_field_table = ComponentTable(data)
+        return self._zero_field_table
+
+    def is_zero_field(self, B, zero_field_tol=0.):
+        """
+        Whether the largest Zeeman shift [AA] of any component at field
+        strength B [kG] is within zero_field_tol, so that the zero-field table
+        can be used instead. Always False for arrays of field strengths, or if
+        zero_field_tol is None.
+        """
+        if zero_field_tol is None or np.ndim(B) != 0:
+            return False
+        if B == 0:
+            return True
+        tab = self.table
+        if len(tab) == 0:
+            return True
+        w_max = 1e8/tab.k0.min()
+        return abs(B) * np.abs(tab.dk).max() * w_max**2/1e8 <= zero_field_tol
 
     @staticmethod
     def relative_strength(Ji, Jf, mi, mf):
@@ -67,49 +274,231 @@ class Multiplet:
             return Ji**2 - mi**2 if dm == 0 else (Ji-m_)*(Ji-m_-1)/4
         raise ValueError
 
-    def transitions(self, B, T=6000.):
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def relative_strength_table(Ji, Jf):
         """
-        Generator for components in a Zeeman multiplet for an input field strength.
-        Temperature can also be used to obtain a Boltzman factor from the lower
-        energy.
+        Relative strengths of all Zeeman components between levels with
+        angular momenta Ji and Jf, as a (2Ji+1, 2Jf+1) array indexed by mi and
+        mf in ascending order, together with their total. Tables are cached
+        and shared between all multiplets, so must not be modified.
         """
-        for uS, lS in self.states_outer_product():
-            if abs(dJ := uS.J - lS.J) > 1: #dJ selection rule
-                continue
-            if (uS.J, lS.J) == (0, 0): #J=0 to J=0 transitions forbidden
-                continue
+        mis, mfs = np.arange(-Ji, Ji+1), np.arange(-Jf, Jf+1)
+        strengths = np.array([[Multiplet.relative_strength(Ji, Jf, mi, mf) \
+            for mf in mfs] for mi in mis], dtype=float)
+        strengths.setflags(write=False)
+        return strengths, strengths.sum()
 
-            l_substates, u_substates = lS.energies(B), uS.energies(B)
+    def fingerprint(self):
+        """
+        Hash of the states and oscillator strengths of the multiplet, and the
+        ComponentTable version, identifying its compiled table.
+        """
+        key = [ComponentTable.VERSION, self._log_gf.default_factory()]
+        key += [repr(S) for S in self.Lower_states] + ["|"]
+        key += [repr(S) for S in self.Upper_states] + ["|"]
+        key += sorted((float(Jl), float(Ju), float(v)) for (Jl, Ju), v in self._log_gf.items())
+        return hashlib.sha1(repr(key).encode()).hexdigest()
 
-            total_strength = sum(self.relative_strength(lS.J, uS.J, ls.mJ, us.mJ) \
-                for ls, us in product(l_substates, u_substates))
+    def compile(self, cache_dir=None):
+        """
+        Build the ComponentTable of allowed Zeeman components. This walks the
+        level structure once, so that subsequent calls at any field strength
+        only need array arithmetic. Call this again if the states of the
+        multiplet are modified in place.
 
-            gf0 = 10**self.log_gf[lS.J, uS.J]
+        If cache_dir is given, the table is loaded (memory mapped) from a file
+        named by the ComponentTable version and Multiplet.fingerprint in that
+        directory, or compiled and saved there if it does not exist yet.
+        """
+        self._zero_field_table = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir,
+                f"components-v{ComponentTable.VERSION}-{self.fingerprint()}.npy")
+            if os.path.exists(path):
+                self._table = ComponentTable.load(path)
+                return self._table
+            os.makedirs(cache_dir, exist_ok=True)
+            self.compile().save(path)
+            return self._table
 
-            for ls, us in product(l_substates, u_substates):
-                if abs(dmJ := int(us.mJ - ls.mJ)) > 1: #dmJ selection rules
+        rows = []
+        for i_u, uS in enumerate(self.Upper_states):
+            for i_l, lS in enumerate(self.Lower_states):
+                if abs(dJ := uS.J - lS.J) > 1: #dJ selection rule
                     continue
-                if dJ == 0 and (ls.mJ, us.mJ) == (0, 0):
+                if (uS.J, lS.J) == (0, 0): #J=0 to J=0 transitions forbidden
                     continue
-                boltz = np.exp(-ls.k/(0.695*T))
-                w_line = 1e8/(us.k - ls.k)
-                rel_strength = self.relative_strength(lS.J, uS.J, ls.mJ, us.mJ)
-                gf_ = gf0 * rel_strength/total_strength
-                yield w_line, gf_, lS, uS, dmJ, boltz
 
-    def line_profile(self, B, x, res_l, res_g, psi, T, rv):
+                strengths, total_strength = self.relative_strength_table(lS.J, uS.J)
+                #get rather than indexing, which would add missing pairs to log_gf
+                gf0 = 10**self._log_gf.get((lS.J, uS.J), self._log_gf.default_factory())
+
+                ml, mu = lS.mJ_array[:,None], uS.mJ_array[None,:]
+                dmJ = mu - ml
+                allowed = np.abs(dmJ) <= 1 #dmJ selection rules
+                if dJ == 0:
+                    allowed &= (ml != 0) | (mu != 0)
+                i_ml, i_mu = np.nonzero(allowed)
+
+                dk_l, dk_u = lS.splitting_array(1.)[i_ml], uS.splitting_array(1.)[i_mu]
+                gf_ = gf0 * strengths[i_ml, i_mu]/total_strength
+                ones = np.ones(len(i_ml))
+                rows.append(np.array([
+                    (uS.k0-lS.k0)*ones, dk_u-dk_l, lS.k0*ones, dk_l,
+                    gf_, dmJ[i_ml, i_mu], i_l*ones, i_u*ones,
+                ]))
+        self._table = ComponentTable(np.hstack(rows) if rows else [])
+        return self._table
+
+    def wavenumber_bounds(self):
         """
-        Generator for line profiles of components in the Zeeman multiplet.
+        Minimum and maximum zero-field wavenumbers (cm-1) of the allowed
+        transitions, and an upper bound on the shift of any component per kG.
+        These come from the states alone, without compiling the table.
+        Returns None if there are no allowed transitions.
+        """
+        k_min, k_max, rate = np.inf, -np.inf, 0.
+        for uS, lS in self.states_outer_product():
+            Ju, Jl = float(uS.J), float(lS.J)
+            if abs(Ju - Jl) > 1 or Ju == Jl == 0:
+                continue
+            k0 = uS.k0 - lS.k0
+            k_min, k_max = min(k_min, k0), max(k_max, k0)
+            rate = max(rate, Ju*abs(uS.g_float) + Jl*abs(lS.g_float))
+        if k_min > k_max:
+            return None
+        return k_min, k_max, 0.046686*rate
+
+    def transitions(self, B, T=6000., min_strength=None, relative=True,
+        zero_field_tol=None):
+        """
+        Generator for components in a Zeeman multiplet for an input field strength.
+        Temperature can also be used to obtain a Boltzman factor from the lower
+        energy. Components with gf times Boltzmann factor below min_strength
+        (relative to the strongest component unless relative=False) are
+        skipped. If zero_field_tol is given and the field is negligible (see
+        Multiplet.is_zero_field), one component is instead generated per pair
+        of states, with the summed gf of its pi and sigma components and dmJ
+        of None.
+        """
+        zero_field = self.is_zero_field(B, zero_field_tol)
+        if zero_field:
+            tab, B = self.zero_field_table, 0.
+            gf = tab.gf[::2] + tab.gf[1::2]
+            rows = np.arange(0, len(tab), 2)
+        else:
+            tab = self.table
+            gf, rows = tab.gf, np.arange(len(tab))
+        w_lines, boltzs = tab.wavelengths(B)[..., rows], tab.boltzmann(B, T)[..., rows]
+        if min_strength is None:
+            keep = range(len(rows))
+        else:
+            keep = np.flatnonzero(strong_components(gf*boltzs, min_strength, relative))
+        for i in keep:
+            j = rows[i]
+            lS, uS = self.Lower_states[int(tab.i_lower[j])], self.Upper_states[int(tab.i_upper[j])]
+            dmJ = None if zero_field else int(tab.dmJ[j])
+            yield w_lines[..., i], gf[i], lS, uS, dmJ, boltzs[..., i]
+
+    def _components(self, B, psi, T, rv, min_strength=None, relative=True,
+        zero_field_tol=None):
+        """
+        Observed wavelengths and opacity weights of all components, optionally
+        dropping weak components, see synthesis.strong_components. At zero
+        field, the components of each pair of states are combined into one.
         """
         z = 1 + rv/2.998e5
-        cos2psi, sin2psi = np.cos(psi)**2, np.sin(psi)**2
-        for tr in self.transitions(B, T=T):
-            x_line, gf_, *_, dmJ, boltz = tr
-            rot_factor = sin2psi if dmJ == 0 else 1+cos2psi
-            V = voigt_profile(x-x_line*z, res_g/2.355, res_l/2)
-            yield boltz*gf_*rot_factor * V
+        if self.is_zero_field(B, zero_field_tol):
+            tab = self.zero_field_table
+            x_lines = tab.wavelengths(0.)[::2] * z
+            weights = tab.boltzmann(0., T) * tab.gf * tab.rotation_factors(psi)
+            weights = weights[::2] + weights[1::2]
+        else:
+            tab = self.table
+            x_lines = tab.wavelengths(B) * z
+            weights = tab.boltzmann(B, T) * tab.gf * tab.rotation_factors(psi)
+        if min_strength is not None:
+            keep = strong_components(weights, min_strength, relative)
+            x_lines, weights = x_lines[..., keep], weights[..., keep]
+        return x_lines, weights
+
+    def _reduced_components(self, B, psi, T, rv, res_l, res_g, min_strength,
+        relative, merge_tol, zero_field_tol):
+        """
+        Components after pruning weak ones and merging those within merge_tol
+        Voigt FWHMs of each other.
+        """
+        x_lines, weights = self._components(B, psi, T, rv, min_strength, relative,
+            zero_field_tol)
+        if merge_tol is not None:
+            x_lines, weights = merge_components(x_lines, weights,
+                merge_tol*voigt_fwhm(res_l, res_g))
+        return x_lines, weights
+
+    def discarded_opacity(self, B, res_l, res_g, min_strength, relative=True,
+        psi=1, T=6000., rv=0, zero_field_tol=0.):
+        """
+        Upper bound on the opacity, at any wavelength, of the components that
+        are dropped by min_strength, i.e. their summed weight times the peak
+        of the Voigt profile.
+        """
+        _, weights = self._components(B, psi, T, rv, zero_field_tol=zero_field_tol)
+        dropped = ~strong_components(weights, min_strength, relative)
+        return weights[..., dropped].sum(axis=-1) * voigt_profile(0., res_g/2.355, res_l/2)
+
+    def line_profile(self, B, x, res_l, res_g, psi, T, rv, min_strength=None,
+        relative=True, merge_tol=None, zero_field_tol=None):
+        """
+        Generator for line profiles of components in the Zeeman multiplet.
+        See Multiplet.opacity for min_strength, relative, merge_tol and
+        zero_field_tol.
+        """
+        for x_line, weight in zip(*self._reduced_components(B, psi, T, rv, res_l,
+            res_g, min_strength, relative, merge_tol, zero_field_tol)):
+            V = voigt_profile(x-x_line, res_g/2.355, res_l/2)
+            yield weight * V
+
+    def opacity(self, B, x, res_l, res_g, psi=1, T=6000., rv=0, cutoff=None,
+        rtol=None, tails=False, engine="direct", voigt_method="scipy",
+        min_strength=None, relative=True, merge_tol=0., zero_field_tol=0.,
+        workers=None, executor=None, split=None, out=None):
+        """
+        Summed opacity of all components of the multiplet, i.e. the sum of
+        Multiplet.line_profile. Arguments are as for Multiplet.profile. The
+        Voigt profiles can be truncated to within 'cutoff' FWHMs of each
+        component (or where they drop below 'rtol' of their peak), with the
+        Lorentzian wings optionally added analytically with 'tails'. For
+        uniform wavelength grids, engine="fft" convolves a stick spectrum of
+        the components with a single Voigt kernel. Faster approximations to
+        the Voigt profile can be selected with 'voigt_method', see
+        lineshapes.voigt. See synthesis.sum_profiles for details. The result
+        is written into 'out' if it is given.
+
+        Components weaker than 'min_strength' (relative to the strongest
+        component unless relative=False) are dropped before any Voigt
+        evaluation, see Multiplet.discarded_opacity for the resulting error.
+        Components within 'merge_tol' Voigt FWHMs of each other are merged
+        into one; the default of zero merges coincident components, and None
+        disables merging. If no component is shifted by more than
+        'zero_field_tol' [AA], e.g. at B=0, the field is neglected and one
+        component is used per pair of states (see Multiplet.is_zero_field);
+        None disables this.
 
-    def profile(self, B, x, strength, res_l, res_g, psi=1, T=6000., rv=0):
+        With 'workers' threads, or a reusable 'executor', the wavelength grid
+        (or with split="components", the default for engine="fft", the
+        components) is divided into chunks that are evaluated concurrently,
+        see synthesis.sum_profiles.
+        """
+        if out is not None:
+            out[...] = 0
+        x_lines, weights = self._reduced_components(B, psi, T, rv, res_l, res_g,
+            min_strength, relative, merge_tol, zero_field_tol)
+        return sum_profiles(x, x_lines, weights, res_l, res_g, out, cutoff=cutoff,
+            rtol=rtol, tails=tails, engine=engine, voigt_method=voigt_method,
+            workers=workers, executor=executor, split=split)
+
+    def profile(self, B, x, strength, res_l, res_g, psi=1, T=6000., rv=0, **kwargs):
         """
         Caclulates a synthetic spectrum of a multiplet in a magnetic field
         B : field strength in [kG]
@@ -120,6 +509,164 @@ class Multiplet:
         psi: viewing angle [radians]
         T: temperature [K]
         rv: radial velocity [km/s]
+        Further keyword arguments (cutoff, rtol, tails, engine, voigt_method,
+        min_strength, relative, merge_tol, zero_field_tol, workers, executor,
+        split, out) are passed to Multiplet.opacity. With a preallocated 'out'
+        array, the spectrum is calculated without any large allocations.
+        """
+        ylines = self.opacity(B, x, res_l, res_g, psi, T, rv, **kwargs)
+        ylines *= -strength
+        return np.exp(ylines, out=ylines)
+
+    def profile_stream(self, B, chunks, strength, res_l, res_g, psi=1, T=6000.,
+        rv=0, margin=None, min_strength=None, relative=True, merge_tol=0.,
+        zero_field_tol=0., **kwargs):
+        """
+        Generator of synthetic spectra for each of an iterable of wavelength
+        arrays 'chunks', e.g. consecutive slices of a very long (or memory
+        mapped) grid. Each chunk only uses the components within 'margin' [AA]
+        of its range, so memory is bounded by the chunk size. By default the
+        margin is the truncation distance of the profiles if 'cutoff' or
+        'rtol' is given, and 100 Voigt FWHMs otherwise, as for
+        SpectrumModel.opacity. Other arguments are as for Multiplet.profile,
+        with further keyword arguments passed to synthesis.sum_profiles. A new
+        array is allocated for each chunk, so 'out' is not accepted; use
+        Multiplet.profile_chunked to write into a preallocated array.
+        """
+        if 'out' in kwargs:
+            raise ValueError("profile_stream allocates each chunk and does not take out")
+        if margin is None:
+            cutoff = kwargs.get('cutoff')
+            if kwargs.get('rtol') is not None:
+                cutoff = cutoff_from_tolerance(kwargs['rtol'], res_l, res_g)
+            margin = (100 if cutoff is None else cutoff) * voigt_fwhm(res_l, res_g)
+        x_lines, weights = self._reduced_components(B, psi, T, rv, res_l, res_g,
+            min_strength, relative, merge_tol, zero_field_tol)
+        order = np.argsort(x_lines)
+        x_lines, weights = x_lines[order], weights[order]
+        for x in chunks:
+            x = np.asarray(x)
+            if x.size == 0:
+                yield np.ones(x.shape)
+                continue
+            i0 = np.searchsorted(x_lines, x.min()-margin, side='left')
+            i1 = np.searchsorted(x_lines, x.max()+margin, side='right')
+            tau = sum_profiles(x, x_lines[i0:i1], weights[i0:i1], res_l, res_g,
+                **kwargs)
+            tau *= -strength
+            yield np.exp(tau, out=tau)
+
+    def profile_chunked(self, B, x, strength, res_l, res_g, psi=1, T=6000.,
+        rv=0, out=None, chunk_size=2**16, **kwargs):
+        """
+        Synthetic spectrum on a long wavelength grid x, calculated in chunks
+        of 'chunk_size' pixels with Multiplet.profile_stream, to which
+        keyword arguments are passed. x and 'out' may be memory mapped, e.g.
+        with np.lib.format.open_memmap, to write a model straight to disk.
+        """
+        if out is None:
+            out = np.empty(len(x))
+        elif len(out) != len(x):
+            raise ValueError("out must have the same length as x")
+        starts = range(0, len(x), chunk_size)
+        chunks = (x[i:i+chunk_size] for i in starts)
+        for i, flux in zip(starts, self.profile_stream(B, chunks, strength, res_l,
+            res_g, psi, T, rv, **kwargs)):
+            out[i:i+chunk_size] = flux
+        return out
+
+    def profile_grid(self, B, x, strength, res_l, res_g, psi=1, T=6000., rv=0,
+        out=None, block_size=2**22):
+        """
+        Calculates synthetic spectra of a multiplet for an array of field
+        strengths B [kG], returning an array of shape (n_B, n_x). The other
+        arguments are as for Multiplet.profile. The result can be written into
+        a preallocated array passed as 'out'. Field strengths are processed in
+        blocks of at most 'block_size' pixels to bound temporary memory.
+        """
+        B, x = np.atleast_1d(B).astype(float), np.asarray(x)
+        if out is None:
+            out = np.empty((len(B), len(x)))
+        elif out.shape != (len(B), len(x)):
+            raise ValueError("out must have shape (n_B, n_x)")
+
+        out[...] = 0
+        x_lines, weights = self._components(B, psi, T, rv)
+        sum_profiles_batch(x, x_lines, weights, res_l, res_g, out, block_size)
+        out *= -strength
+        return np.exp(out, out=out)
+
+    def profile_distribution(self, B, B_weights, x, strength, res_l, res_g,
+        psi=1, T=6000., rv=0, engine="fft", out=None, **kwargs):
+        """
+        Calculates a synthetic spectrum for a distribution of field strengths,
+        e.g. a histogram of the field over the stellar surface. B is an array
+        of field strengths [kG] and B_weights their relative weights (or a
+        single shared weight), which are normalised to sum to one. Other
+        arguments are as for Multiplet.profile.
+
+        The opacity is linear in the weights, so the components for all field
+        strengths are combined into a single stick spectrum and, by default,
+        convolved once with the Voigt profile (see synthesis.sum_profiles_fft).
+        Further keyword arguments are passed to synthesis.sum_profiles.
         """
-        ylines = sum(self.line_profile(B, x, res_l, res_g, psi, T, rv))
-        return np.exp(-strength*ylines)
+        B = np.atleast_1d(B).astype(float)
+        B_weights = np.broadcast_to(np.asarray(B_weights, dtype=float), B.shape)
+        total = np.sum(B_weights)
+        if total == 0:
+            raise ValueError("B_weights must not sum to zero")
+        B_weights = B_weights / total
+        x_lines, weights = self._components(B, psi, T, rv)
+        weights = weights * B_weights[:,None]
+        if out is not None:
+            out[...] = 0
+        ylines = sum_profiles(x, x_lines.ravel(), weights.ravel(), res_l, res_g,
+            out, engine=engine, **kwargs)
+        ylines *= -strength
+        return np.exp(ylines, out=ylines)
+
+    def profile_and_jacobian(self, B, x, strength, res_l, res_g, psi=1, T=6000., rv=0):
+        """
+        Calculates a synthetic spectrum as for Multiplet.profile, together with
+        its analytic derivatives with respect to each of JACOBIAN_PARAMS, i.e.
+        (B, strength, res_l, res_g, psi, rv). The jacobian is returned as an
+        array of shape (6, n_x). The derivatives use the same Faddeeva
+        function evaluations as the profile itself, which requires res_g > 0
+        (pure Lorentzian profiles are not supported).
+        """
+        if res_g <= 0:
+            raise ValueError("profile_and_jacobian requires res_g > 0")
+        x = np.asarray(x)
+        tab = self.table
+        z = 1 + rv/2.998e5
+        x_rest = tab.wavelengths(B)
+        x_lines = x_rest * z
+        boltz_gf = tab.boltzmann(B, T) * tab.gf
+        weights = boltz_gf * tab.rotation_factors(psi)
+        drot_dpsi = np.where(tab.dmJ == 0, 1, -1) * np.sin(2*psi)
+
+        #derivatives of weights and line centres
+        dw_dB = weights * -tab.dk_lower/(0.695*T)
+        dx_dB = -x_rest**2 * tab.dk/1e8 * z
+        dx_drv = x_rest/2.998e5
+
+        sigma, gamma = res_g/2.355, res_l/2
+        tau = np.zeros(x.shape)
+        dtau = np.zeros((len(self.JACOBIAN_PARAMS),) + x.shape)
+        for i, x_line in enumerate(x_lines):
+            V, dV_dx, dV_dsigma, dV_dgamma = voigt_derivatives(x-x_line, sigma, gamma)
+            tau += weights[i] * V
+            dtau[0] += dw_dB[i]*V - weights[i]*dV_dx*dx_dB[i]
+            dtau[2] += weights[i] * dV_dgamma/2
+            dtau[3] += weights[i] * dV_dsigma/2.355
+            dtau[4] += boltz_gf[i]*drot_dpsi[i] * V
+            dtau[5] -= weights[i] * dV_dx*dx_drv[i]
+
+        model = tau * -strength
+        np.exp(model, out=model)
+        jacobian = dtau
+        jacobian *= model
+        jacobian *= -strength
+        np.multiply(tau, model, out=jacobian[1])
+        jacobian[1] *= -1
+        return model, jacobian